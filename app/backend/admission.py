@@ -0,0 +1,199 @@
+from azure.core.exceptions import HttpResponseError
+from contextlib import asynccontextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+import time
+
+# Monotonic time by which the current request must be answered
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def deadline_context(deadline: Optional[float]) -> Context:
+    """
+    A copy of the current context with `deadline` as the request deadline, to start work shared
+    by several requests in (`context.run(asyncio.ensure_future, coro)`), so that no single
+    caller's deadline cuts it short; each caller enforces its own while it waits.
+    """
+    context = copy_context()
+    context.run(request_deadline.set, deadline)
+    return context
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a call that cannot be admitted before its deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Per-minute quota refilled continuously; the level may go negative after under-estimates."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken, assuming nothing else is taken first."""
+        if self.unlimited:
+            return 0.0
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.rate)
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.level -= amount
+
+
+def retry_after_from(error: HttpResponseError) -> Optional[float]:
+    headers = getattr(error.response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 1000.0), ("x-ms-retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) / scale
+            except ValueError:
+                pass
+    return None
+
+
+def reported_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+class RateLimitScheduler:
+    """
+    Admits calls to one model deployment against its tokens-per-minute and requests-per-minute
+    quotas. Calls wait in FIFO order for budget; a call whose deadline would pass in the queue,
+    or that finds `max_queue` calls already waiting, is rejected at once with `Overloaded`.
+    An upstream 429 pauses the deployment for its Retry-After instead of letting the burst retry.
+    """
+
+    def __init__(self, name: str, tpm: int, rpm: int, max_queue: int, timeout: float):
+        self.name = name
+        self.tokens = TokenBucket(tpm)
+        self.requests = TokenBucket(rpm)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.queued_tokens = 0.0
+        self.paused_until = 0.0
+
+        self.admitted = 0
+        self.shed = 0
+        self.throttled = 0
+        self.queue_delay_total = 0.0
+        self.estimated_total = 0.0
+        self.actual_total = 0.0
+
+    def _wait_time(self, now: float, tokens: float) -> float:
+        self.tokens.refill(now)
+        self.requests.refill(now)
+        return max(self.paused_until - now, self.tokens.wait_time(tokens), self.requests.wait_time(1))
+
+    def _reject(self, reason: str, retry_after: float):
+        self.shed += 1
+        raise Overloaded(f"{self.name} {reason}", retry_after=max(1.0, retry_after))
+
+    async def acquire(self, tokens: float, deadline: Optional[float] = None):
+        now = time.monotonic()
+        # A call may queue for at most `timeout`, and never past the request deadline
+        deadline = min(deadline, now + self.timeout) if deadline is not None else now + self.timeout
+        if self.waiting >= self.max_queue:
+            self._reject("queue is full", self._wait_time(now, self.queued_tokens + tokens))
+        # Everything queued ahead is served first, so this call waits for their budget too
+        expected = self._wait_time(now, self.queued_tokens + tokens)
+        if now + expected > deadline:
+            self._reject("quota exhausted", expected)
+
+        self.waiting += 1
+        self.queued_tokens += tokens
+        try:
+            try:
+                await asyncio.wait_for(self._lock.acquire(), timeout=max(0.0, deadline - now))
+            except asyncio.TimeoutError:
+                self._reject("queue wait exceeded the deadline", expected)
+            try:
+                wait = self._wait_time(time.monotonic(), tokens)
+                if time.monotonic() + wait > deadline:
+                    self._reject("quota exhausted", wait)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    self._wait_time(time.monotonic(), tokens)
+                self.tokens.take(tokens)
+                self.requests.take(1)
+            finally:
+                self._lock.release()
+        finally:
+            self.waiting -= 1
+            self.queued_tokens -= tokens
+
+        self.admitted += 1
+        self.estimated_total += tokens
+        self.queue_delay_total += time.monotonic() - now
+
+    def try_acquire(self, tokens: float) -> bool:
+        """Take budget for a call only if it is available right now and nobody is queued."""
+        if self.waiting or self._wait_time(time.monotonic(), tokens) > 0:
+            return False
+        self.tokens.take(tokens)
+        self.requests.take(1)
+        self.admitted += 1
+        self.estimated_total += tokens
+        return True
+
+    def settle(self, estimated: float, actual: Optional[float]):
+        """Correct the token budget once the service reports what the call really used."""
+        if actual is None:
+            return
+        self.actual_total += actual
+        self.tokens.take(actual - estimated)
+
+    def pause(self, seconds: float):
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, tokens: float) -> AsyncIterator[None]:
+        """Admit one call of roughly `tokens` tokens; upstream 429s become `Overloaded`."""
+        await self.acquire(tokens, request_deadline.get())
+        try:
+            yield
+        except HttpResponseError as e:
+            if e.status_code != 429:
+                raise
+            retry_after = retry_after_from(e) or 60.0 / max(self.requests.capacity, 1.0)
+            self.pause(retry_after)
+            raise Overloaded(f"{self.name} is rate limited upstream", retry_after=max(1.0, retry_after)) from e
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        self._wait_time(now, 0)
+        return {
+            "tpm": int(self.tokens.capacity),
+            "rpm": int(self.requests.capacity),
+            "tokens_available": None if self.tokens.unlimited else round(self.tokens.level),
+            "requests_available": None if self.requests.unlimited else round(self.requests.level, 1),
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "throttled_upstream": self.throttled,
+            "paused_for_s": round(max(0.0, self.paused_until - now), 2),
+            "queue_delay_ms_mean": self.queue_delay_total / self.admitted * 1000 if self.admitted else 0.0,
+            "estimated_tokens": round(self.estimated_total),
+            "reported_tokens": round(self.actual_total),
+        }
@@ -0,0 +1,179 @@
+"""
+Bounded-concurrency batch runner behind /api/chat/batch, and a CLI that sends a query file
+of any length to that endpoint, --batch-size queries per request, and writes the NDJSON
+results as they arrive:
+
+    python batch.py queries.jsonl --url http://localhost:8000 --concurrency 16 --batch-size 1000 --output results.ndjson
+
+Each input line is either a JSON string or an object with a "query" field and an optional
+"id" that is echoed back. Lines that are not JSON are taken as plain query text.
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import argparse
+import asyncio
+import httpx
+import json
+import os
+import sys
+import time
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def parse_batch_item(raw: Any) -> Tuple[Optional[str], Any]:
+    """The query text and caller id of one batch item; the query is None when the item is unusable."""
+    if isinstance(raw, str):
+        return raw.strip() or None, None
+    if isinstance(raw, dict):
+        query = raw.get("query")
+        return (query.strip() or None) if isinstance(query, str) else None, raw.get("id")
+    return None, None
+
+
+def parse_line(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return line
+
+
+async def iter_jsonl(body: bytes) -> AsyncIterator[Any]:
+    """Parse JSONL one line at a time, as workers ask for more input."""
+    start = 0
+    while start < len(body):
+        end = body.find(b"\n", start)
+        end = len(body) if end < 0 else end
+        line = body[start:end].strip()
+        start = end + 1
+        if line:
+            yield parse_line(line.decode("utf-8"))
+
+
+async def iter_list(items: Iterable[T]) -> AsyncIterator[T]:
+    for item in items:
+        yield item
+
+
+async def run_bounded(
+    items: AsyncIterator[T], handler: Callable[[Tuple[int, T]], Awaitable[R]], concurrency: int
+) -> AsyncIterator[R]:
+    """
+    Run `handler((index, item))` for every item with at most `concurrency` in flight and yield
+    results in completion order; `handler` should report per-item failures in its result.
+    Input is pulled only as workers free up, so memory stays flat however long the input is.
+    """
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def feed():
+        index = 0
+        try:
+            async for item in items:
+                await inbox.put((index, item))
+                index += 1
+        finally:
+            for _ in range(concurrency):
+                await inbox.put(None)
+
+    async def work():
+        try:
+            while True:
+                entry = await inbox.get()
+                if entry is None:
+                    break
+                await outbox.put(await handler(entry))
+        finally:
+            await outbox.put(None)
+
+    tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(work()) for _ in range(concurrency)]
+    finished = 0
+    try:
+        while finished < concurrency:
+            result = await outbox.get()
+            if result is None:
+                finished += 1
+                continue
+            yield result
+        # Surface a failure to read the input or an exception from `handler`
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def read_chunks(path: str, size: int) -> Iterator[bytes]:
+    """The non-blank lines of a JSONL file (or stdin for "-"), `size` lines per JSONL body."""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        lines: List[str] = []
+        for line in stream:
+            if line.strip():
+                lines.append(line if line.endswith("\n") else line + "\n")
+            if len(lines) == size:
+                yield "".join(lines).encode("utf-8")
+                lines = []
+        if lines:
+            yield "".join(lines).encode("utf-8")
+
+
+async def send_file(
+    path: str, url: str, concurrency: int, output, admin_key: Optional[str] = None, batch_size: int = 1000
+) -> dict:
+    """
+    Send the queries in requests of at most `batch_size` (the server's BATCH_MAX_ITEMS) one
+    after another, and write the results with their index into the whole file.
+    """
+    summary = {"results": 0, "errors": 0}
+    start = time.perf_counter()
+    offset = 0
+    async with httpx.AsyncClient(timeout=None) as client:
+        for body in read_chunks(path, batch_size):
+            async with client.stream(
+                "POST",
+                f"{url.rstrip('/')}/api/chat/batch",
+                params={"concurrency": concurrency},
+                content=body,
+                headers={"Content-Type": "application/x-ndjson", "X-Admin-Key": admin_key or ""},
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    record["index"] += offset
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    summary["results"] += 1
+                    if "error" in record:
+                        summary["errors"] += 1
+            offset += body.count(b"\n")
+    summary["duration_s"] = round(time.perf_counter() - start, 2)
+    summary["queries_per_s"] = round(summary["results"] / summary["duration_s"], 2) if summary["duration_s"] else 0.0
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries through /api/chat/batch")
+    parser.add_argument("input", help="JSONL file of queries, or - for stdin")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="write NDJSON results here instead of stdout")
+    parser.add_argument("--batch-size", type=int, default=1000, help="queries per request, up to BATCH_MAX_ITEMS")
+    parser.add_argument(
+        "--admin-key", default=os.getenv("ADMIN_KEY"), help="the server's ADMIN_KEY (default: $ADMIN_KEY)"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = asyncio.run(
+            send_file(args.input, args.url, args.concurrency, output, args.admin_key, args.batch_size)
+        )
+    finally:
+        if args.output:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
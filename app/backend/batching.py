@@ -0,0 +1,89 @@
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from admission import deadline_context, request_deadline
+import asyncio
+import time
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests that arrive within `window_ms` of each other (or until
+    `max_batch` are waiting) into one call to `embed_many`, then hands every caller its own
+    vector. `embed_many` is a coroutine function returning one vector per input.
+
+    A batch runs until the latest deadline among its callers (none if any caller has none);
+    callers with an earlier deadline stop waiting on their own.
+    """
+
+    def __init__(self, embed_many: Callable[[List[str]], Awaitable[Sequence]], window_ms: float, max_batch: int):
+        self.embed_many = embed_many
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future, float, Optional[float]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.batch_sizes: Counter = Counter()
+        self.requests = 0
+        self.dispatched = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    async def embed(self, text: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter(), request_deadline.get()))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            deadlines = [deadline for *_, deadline in batch]
+            latest = None if None in deadlines else max(deadlines)
+            deadline_context(latest).run(asyncio.ensure_future, self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float, Optional[float]]]):
+        started = time.perf_counter()
+        self.dispatched += len(batch)
+        for _, _, enqueued, _ in batch:
+            delay = started - enqueued
+            self.queue_delay_total += delay
+            self.queue_delay_max = max(self.queue_delay_max, delay)
+
+        # Identical texts in one window share a single input
+        texts = list(dict.fromkeys(text for text, *_ in batch))
+        self.batch_sizes[len(texts)] += 1
+        try:
+            vectors = await self.embed_many(texts)
+        except Exception as e:
+            for _, future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future, *_ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> Dict:
+        batches = sum(self.batch_sizes.values())
+        inputs = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "requests": self.requests,
+            "batches": batches,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "mean_batch_size": inputs / batches if batches else 0.0,
+            "queue_delay_ms_mean": self.queue_delay_total / self.dispatched * 1000 if self.dispatched else 0.0,
+            "queue_delay_ms_max": self.queue_delay_max * 1000,
+        }
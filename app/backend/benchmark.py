@@ -0,0 +1,333 @@
+"""
+Offline end-to-end benchmark for the chat backend.
+
+Drives the real FastAPI app in-process with local stand-ins for the chat-completion,
+embedding and search services, at fixed concurrency levels, and writes the results to
+JSON so runs can be compared over time.
+
+    python benchmark.py --concurrency 1,8,32 --requests 200 --output results.json
+"""
+
+from azure.core.exceptions import HttpResponseError
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
+import numpy as np
+import argparse
+import asyncio
+import hashlib
+import random
+import json
+import time
+import sys
+import os
+
+os.environ.setdefault("CONNECTION_STRING", "offline-benchmark")
+
+import httpx  # noqa: E402
+import chat  # noqa: E402
+from search_backends import LocalVectorBackend, product_chunk  # noqa: E402
+from admission import RateLimitScheduler  # noqa: E402
+from hedging import Hedger  # noqa: E402
+from rerank import Reranker  # noqa: E402
+from products import load_products  # noqa: E402
+
+EMBEDDING_DIM = 1536
+
+
+class LatencyModel:
+    """
+    Log-normal latency with a given median, plus an independent error rate. A `slow_rate`
+    fraction of calls take `slow_factor` times longer, like a stalled upstream replica.
+    """
+
+    def __init__(
+        self,
+        median_ms: float,
+        sigma: float = 0.3,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+    ):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.rng = random.Random(seed)
+
+    def wait(self, service: str):
+        delay = self.median * self.rng.lognormvariate(0, self.sigma) if self.median else 0
+        if self.rng.random() < self.slow_rate:
+            delay *= self.slow_factor
+        time.sleep(delay)
+        if self.rng.random() < self.error_rate:
+            error = HttpResponseError(message=f"Injected {service} failure")
+            error.status_code = 500
+            raise error
+
+
+class StageRecorder:
+    """Wall-clock time each fake spends per call, grouped by pipeline stage."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.prompt_tokens: List[float] = []
+
+    def record(self, stage: str, start: float):
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    """Deterministic unit vector for `text`; shared words give correlated vectors."""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in text.lower().split():
+        seed = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vector += np.random.default_rng(seed).standard_normal(EMBEDDING_DIM, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeChatCompletions:
+    def __init__(self, latency: LatencyModel, recorder: StageRecorder):
+        self.latency = latency
+        self.recorder = recorder
+
+    def complete(self, model=None, messages=None, max_tokens=300, stream=False, **kwargs):
+        start = time.perf_counter()
+        # The intent rewrite is the only call capped at 150 tokens
+        stage = "rewrite" if max_tokens == 150 else "generate"
+        self.latency.wait(stage)
+        question = messages[-1]["content"]
+        if stage == "rewrite":
+            content = json.dumps({"search_query": question})
+        else:
+            content = json.dumps({"mainAnswer": "Benchmark answer", "productDetails": [], "referenceLink": ""})
+        self.recorder.record(stage, start)
+        prompt_tokens = sum(chat.count_tokens(message["content"]) for message in messages)
+        completion_tokens = chat.count_tokens(content)
+        if stage == "generate":
+            self.recorder.prompt_tokens.append(prompt_tokens)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        if stream:
+            return iter(
+                [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=usage)]
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def close(self):
+        pass
+
+
+class FakeEmbeddings:
+    def __init__(self, latency: LatencyModel, recorder: StageRecorder):
+        self.latency = latency
+        self.recorder = recorder
+
+    def embed(self, model=None, input=None, **kwargs):
+        start = time.perf_counter()
+        self.latency.wait("embed")
+        inputs = input if isinstance(input, list) else [input]
+        data = [SimpleNamespace(index=i, embedding=fake_embedding(text).tolist()) for i, text in enumerate(inputs)]
+        self.recorder.record("embed", start)
+        return SimpleNamespace(data=data)
+
+    def close(self):
+        pass
+
+
+class FakeSearchBackend:
+    """Local vector search over the product corpus with injected service latency."""
+
+    name = "fake"
+
+    def __init__(self, products: List[Dict], latency: LatencyModel, recorder: StageRecorder):
+        chunks = [{"chunk": product_chunk(p), "parent_id": p.get("url", "")} for p in products]
+        matrix = np.stack([fake_embedding(c["chunk"]) for c in chunks]) if chunks else np.zeros((0, EMBEDDING_DIM))
+        self.index = LocalVectorBackend(matrix.astype(np.float32), chunks)
+        self.latency = latency
+        self.recorder = recorder
+
+    def search(self, query_vector, top_k):
+        start = time.perf_counter()
+        self.latency.wait("search")
+        results = self.index.search(query_vector, top_k)
+        self.recorder.record("search", start)
+        return results
+
+
+def generate_queries(products: List[Dict], count: int, seed: int = 0) -> List[str]:
+    """Realistic question mix built from the scraped corpus."""
+    rng = random.Random(seed)
+    if not products:
+        products = [{"name": "KITKAT 4-Finger Wafer Bar", "brand": "KitKat"}, {"name": "AERO Bar", "brand": "Aero"}]
+    templates = [
+        "How many calories are in {name}?",
+        "What are the ingredients in {name}?",
+        "Is {name} gluten free?",
+        "Tell me about {brand} products",
+        "What {brand} flavours are there?",
+        "Where can I buy {name}?",
+        "Does {name} contain nuts?",
+    ]
+    chatter = ["hi", "who are you", "thanks!"]
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            queries.append(rng.choice(chatter))
+            continue
+        product = rng.choice(products)
+        queries.append(rng.choice(templates).format(name=product.get("name", ""), brand=product.get("brand", "")))
+    return queries
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values)
+    return {
+        "count": len(values),
+        "mean": round(float(array.mean()), 2),
+        "p50": round(float(np.percentile(array, 50)), 2),
+        "p95": round(float(np.percentile(array, 95)), 2),
+        "p99": round(float(np.percentile(array, 99)), 2),
+        "max": round(float(array.max()), 2),
+    }
+
+
+def install_fakes(args, products: List[Dict]) -> StageRecorder:
+    recorder = StageRecorder()
+    chat.clients.chat = FakeChatCompletions(
+        LatencyModel(args.chat_latency_ms, args.sigma, args.error_rate, 1, args.slow_rate, args.slow_factor), recorder
+    )
+    chat.clients.embeddings = FakeEmbeddings(
+        LatencyModel(args.embed_latency_ms, args.sigma, args.error_rate, seed=2), recorder
+    )
+    chat.clients.search_backend = FakeSearchBackend(
+        products, LatencyModel(args.search_latency_ms, args.sigma, args.error_rate, seed=3), recorder
+    )
+    # Fresh quotas and latency history per level; the default quotas leave model calls unthrottled
+    settings = chat.settings
+    chat.hedger = Hedger(settings.HEDGE_PERCENTILE, settings.HEDGE_MIN_DELAY_MS, settings.HEDGE_MAX_RATIO)
+    chat.hedger.enabled = not args.no_hedge
+    settings.RERANK_ENABLED = args.rerank
+    chat.reranker = Reranker(settings.RERANK_VECTOR_WEIGHT, settings.RERANK_MIN_RATIO)
+    chat.chat_scheduler = RateLimitScheduler(
+        "chat", args.chat_tpm, args.chat_rpm, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_TIMEOUT
+    )
+    chat.embed_scheduler = RateLimitScheduler(
+        "embeddings", args.embed_tpm, args.embed_rpm, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_TIMEOUT
+    )
+    return recorder
+
+
+async def run_level(concurrency: int, queries: List[str], endpoint: str) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    pending = iter(queries)
+
+    async def worker(client: httpx.AsyncClient):
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json={"query": query})
+                status = response.status_code
+            except Exception:
+                status = 599
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    transport = httpx.ASGITransport(app=chat.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+    }
+
+
+def reset_caches():
+    chat.query_cache.clear()
+    chat.answer_cache.invalidate()
+
+
+async def main(args) -> Dict:
+    products = load_products(args.products_dir)
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        recorder = install_fakes(args, products)
+        if not args.warm_cache:
+            reset_caches()
+        queries = generate_queries(products, args.requests, seed=concurrency)
+        level = await run_level(concurrency, queries, args.endpoint)
+        level["stages_ms"] = recorder.summary()
+        level["prompt_tokens"] = summarize(recorder.prompt_tokens)
+        level["rerank"] = chat.reranker.stats()
+        level["hedging"] = chat.hedger.stats()
+        level["admission"] = {"chat": chat.chat_scheduler.stats(), "embeddings": chat.embed_scheduler.stats()}
+        levels.append(level)
+        latency = level["latency_ms"]
+        print(
+            f"concurrency={concurrency:<4} rps={level['rps']:<8} p50={latency.get('p50')}ms "
+            f"p95={latency.get('p95')}ms p99={latency.get('p99')}ms errors={level['errors']} "
+            f"prompt_tokens={level['prompt_tokens'].get('mean')} rerank_cpu_ms={level['rerank']['cpu_ms_mean']:.3f}"
+        )
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "products": len(products),
+        "levels": levels,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the chat backend with local Azure stand-ins")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--endpoint", default="/api/chat")
+    parser.add_argument("--products-dir", default=chat.settings.PRODUCTS_DIR)
+    parser.add_argument("--chat-latency-ms", type=float, default=400.0, help="median chat completion latency")
+    parser.add_argument("--embed-latency-ms", type=float, default=40.0, help="median embedding latency")
+    parser.add_argument("--search-latency-ms", type=float, default=60.0, help="median search latency")
+    parser.add_argument("--sigma", type=float, default=0.3, help="log-normal spread of every latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of chat calls that are very slow")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="how much slower those calls are")
+    parser.add_argument("--no-hedge", action="store_true", help="disable hedged upstream calls")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--chat-tpm", type=int, default=0, help="chat tokens-per-minute quota (0: unlimited)")
+    parser.add_argument("--chat-rpm", type=int, default=0, help="chat requests-per-minute quota (0: unlimited)")
+    parser.add_argument("--embed-tpm", type=int, default=0, help="embedding tokens-per-minute quota (0: unlimited)")
+    parser.add_argument("--embed-rpm", type=int, default=0, help="embedding requests-per-minute quota (0: unlimited)")
+    parser.add_argument("--rerank", action="store_true", help="retrieve wide and rerank locally (RERANK_ENABLED)")
+    parser.add_argument("--warm-cache", action="store_true", help="keep caches between concurrency levels")
+    parser.add_argument("--output", help="write results JSON here")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        json.dump(results, sys.stdout, indent=2)
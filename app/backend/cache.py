@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+import time
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as a cache key: case-folded, single-spaced, without trailing punctuation."""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    """
+    Two-level cache in front of get_embeddings:
+    normalized user query -> rewritten search query, and
+    normalized search query -> float32 embedding vector.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.rewrites = TTLCache(maxsize, ttl)
+        self.embeddings = TTLCache(maxsize, ttl)
+
+    def get_rewrite(self, query: str) -> Optional[str]:
+        return self.rewrites.get(normalize_query(query))
+
+    def set_rewrite(self, query: str, search_query: str):
+        self.rewrites.set(normalize_query(query), search_query)
+
+    def get_embedding(self, search_query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(normalize_query(search_query))
+
+    def set_embedding(self, search_query: str, vector) -> np.ndarray:
+        # 4 bytes per dimension instead of a boxed Python float per element
+        array = np.asarray(vector, dtype=np.float32)
+        array.setflags(write=False)
+        self.embeddings.set(normalize_query(search_query), array)
+        return array
+
+    def clear(self):
+        self.rewrites.clear()
+        self.embeddings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rewrites": self.rewrites.stats(), "embeddings": self.embeddings.stats()}
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by query embedding. A lookup returns the stored entry whose
+    vector has the highest cosine similarity to the query, provided it clears `threshold`.
+    All cached vectors live in one preallocated, L2-normalized float32 matrix so a
+    lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, maxsize: int, threshold: float, ttl: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._values: list = [None] * maxsize
+        self._expires_at = np.zeros(maxsize, dtype=np.float64)
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._occupied = np.zeros(maxsize, dtype=bool)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        if array.ndim != 1:
+            raise ValueError(f"Expected a 1-D embedding, got shape {array.shape}")
+        norm = np.linalg.norm(array)
+        if norm == 0:
+            return None
+        return array / norm
+
+    def get(self, vector) -> Optional[Any]:
+        query = self._normalize(vector)
+        with self._lock:
+            if query is None or self._matrix is None or not self._occupied.any():
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            self._occupied &= self._expires_at > now
+            similarities = self._matrix @ query
+            similarities[~self._occupied] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            return self._values[best]
+
+    def set(self, vector, value: Any):
+        row = self._normalize(vector)
+        if row is None or self.maxsize <= 0:
+            return
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != row.shape[0]:
+                self._matrix = np.zeros((self.maxsize, row.shape[0]), dtype=np.float32)
+                self._occupied[:] = False
+
+            now = time.monotonic()
+            self._occupied &= self._expires_at > now
+            free = np.flatnonzero(~self._occupied)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._matrix[slot] = row
+            self._values[slot] = value
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._occupied[slot] = True
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the product index has been refreshed."""
+        with self._lock:
+            self._occupied[:] = False
+            self._values = [None] * self.maxsize
+            self.invalidations += 1
+
+    def __len__(self) -> int:
+        return int(self._occupied.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,22 +1,64 @@
-from azure.ai.projects import AIProjectClient
-from azure.ai.projects.models import ConnectionType
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.identity import DefaultAzureCredential
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from azure.search.documents.models import VectorizedQuery
-from typing import List, Tuple, Dict
-from pydantic.main import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import AsyncIterator, List, Optional, Tuple, Dict
+from contextlib import asynccontextmanager
+from functools import partial
 from config import get_settings
-import tiktoken
-import os
+from executor import run_blocking, shutdown_executor
+from cache import QueryCache, SemanticCache, normalize_query
+from context import ContextPacker, get_encoding
+from models import ChatQuery, SearchResult
+from router import CHATTER, QueryRouter, Route
+from clients import AzureClients
+from products import ProductTable, load_products
+from batching import EmbeddingBatcher
+from sessions import Session, SessionStore
+from rerank import Reranker
+from batch import iter_jsonl, iter_list, parse_batch_item, run_bounded
+from singleflight import SingleFlight
+from hedging import DeadlineExceeded, Hedger, time_left, with_deadline
+from degraded import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, templated_answer
+from admission import Overloaded, RateLimitScheduler, reported_tokens, request_deadline
+from metrics import (
+    REGISTRY,
+    REQUEST_SECONDS,
+    count_answer,
+    record_usage,
+    set_breaker_state,
+    server_timing_header,
+    span,
+    stage_timings,
+)
+import numpy as np
+import asyncio
+import json
+import logging
+import math
+import secrets
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 settings = get_settings()
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Client construction does network I/O, so it happens here rather than at import time
+    start = time.perf_counter()
+    await run_blocking(clients.connect, settings)
+    if settings.WARMUP_ENABLED:
+        await clients.warm_up()
+    clients.timings["startup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Startup complete: {clients.timings}")
+    yield
+    clients.close()
+    shutdown_executor()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,261 +69,847 @@ app.add_middleware(
 )
 
 
-def initialize_clients():
-    project = AIProjectClient.from_connection_string(
-        conn_str=settings.CONNECTION_STRING, credential=DefaultAzureCredential()
-    )
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Record request latency and report per-stage timings in a Server-Timing header."""
+    timings: Dict[str, float] = {}
+    token = stage_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        stage_timings.reset(token)
+    total_ms = (time.perf_counter() - start) * 1000
+
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    REQUEST_SECONDS.observe(total_ms / 1000, path=path, status=response.status_code)
+    response.headers["Server-Timing"] = server_timing_header(timings, total_ms)
+    # Lets the frontend read Server-Timing through the Resource Timing API cross-origin
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
+clients = AzureClients()
+query_cache = QueryCache(maxsize=settings.QUERY_CACHE_SIZE, ttl=settings.QUERY_CACHE_TTL)
+answer_cache = SemanticCache(
+    maxsize=settings.ANSWER_CACHE_SIZE, threshold=settings.ANSWER_CACHE_THRESHOLD, ttl=settings.ANSWER_CACHE_TTL
+)
 
-    search_connection = project.connections.get_default(
-        connection_type=ConnectionType.AZURE_AI_SEARCH, include_credentials=True
-    )
 
-    index_client = SearchIndexClient(
-        endpoint=search_connection.endpoint_url, credential=AzureKeyCredential(key=search_connection.key)
-    )
+def load_corpus() -> Tuple[QueryRouter, ProductTable]:
+    """The query router and product table, built from the product JSON in PRODUCTS_DIR."""
+    corpus = load_products(settings.PRODUCTS_DIR)
+    return QueryRouter.from_corpus(corpus), ProductTable(corpus)
 
-    search_client = SearchClient(
-        index_name=settings.AZURE_SEARCH_INDEX,
-        endpoint=search_connection.endpoint_url,
-        credential=AzureKeyCredential(key=search_connection.key),
-    )
 
-    return project, search_client, index_client
+router, product_table = load_corpus()
+
+# embed_batch is defined below, so it is looked up at call time
+embedding_batcher = EmbeddingBatcher(
+    lambda texts: embed_batch(texts), window_ms=settings.EMBED_BATCH_WINDOW_MS, max_batch=settings.EMBED_BATCH_MAX_SIZE
+)
+inflight = SingleFlight()
+chat_scheduler = RateLimitScheduler(
+    "gpt-4o-mini", settings.CHAT_TPM, settings.CHAT_RPM, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_TIMEOUT
+)
+embed_scheduler = RateLimitScheduler(
+    "text-embedding-ada-002",
+    settings.EMBED_TPM,
+    settings.EMBED_RPM,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_TIMEOUT,
+)
+hedger = Hedger(
+    percentile=settings.HEDGE_PERCENTILE, min_delay_ms=settings.HEDGE_MIN_DELAY_MS, max_ratio=settings.HEDGE_MAX_RATIO
+)
+hedger.enabled = settings.HEDGE_ENABLED
+reranker = Reranker(vector_weight=settings.RERANK_VECTOR_WEIGHT, min_ratio=settings.RERANK_MIN_RATIO)
+generation_breaker = CircuitBreaker(
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.BREAKER_RESET_TIMEOUT,
+    on_state_change=partial(set_breaker_state, states=[CLOSED, HALF_OPEN, OPEN]),
+)
+set_breaker_state(CLOSED, [CLOSED, HALF_OPEN, OPEN])
+session_store = SessionStore(
+    maxsize=settings.SESSION_MAX,
+    idle_ttl=settings.SESSION_IDLE_TTL,
+    history_tokens=settings.SESSION_HISTORY_TOKENS,
+    count_tokens=lambda text: count_tokens(text),
+)
+speculation_stats = {"requests": 0, "kept_raw": 0, "merged": 0, "fell_back": 0, "saved_ms_total": 0.0}
+
 
+CHATTER_REPLY = "I'm here to help with Nestlé products, recipes and nutrition information. What would you like to know?"
+GREETING = "Hello! I am an AI assistant for the Made with Nestlé website. I can help you find recipes, cooking tips, and answer questions about Nestlé products."
 
-project, search_client, index_client = initialize_clients()
-chat = project.inference.get_chat_completions_client()
 
+async def rewrite_query(text: str, history: Optional[List[Dict]] = None) -> str:
+    """Ask the model for a search query that captures the user's intent, given the conversation so far."""
+    # A follow-up's rewrite depends on the conversation, so only standalone questions are cached
+    cached = query_cache.get_rewrite(text) if not history else None
+    if cached is not None:
+        return cached
 
-class ChatQuery(BaseModel):
-    query: str
+    messages = [
+        {
+            "role": "system",
+            "content": """You are an AI assistant that generates search queries for Nestlé website content. 
+            Given a user query, infer the user's intent and provide a search query. Format a JSON response 
+            with a search_query field that would best find relevant information. 
+            Examples: {"search_query": "Does Nestle sell kitkat chocolate"}""",
+        },
+        *(history or []),
+        {"role": "user", "content": text},
+    ]
 
+    estimate = estimate_tokens(messages, 150)
+    async with chat_scheduler.slot(estimate):
+        with span("rewrite"):
+            intent_response = await hedger.call(
+                "rewrite",
+                clients.chat.complete,
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=150,
+                admit_hedge=partial(chat_scheduler.try_acquire, estimate),
+            )
+    chat_scheduler.settle(estimate, reported_tokens(intent_response))
+    record_usage("rewrite", intent_response)
+    search_query = intent_response.choices[0].message.content
+    if not history:
+        query_cache.set_rewrite(text, search_query)
+    return search_query
 
-class SearchResult(BaseModel):
-    content: str
-    source: str
-    score: float
 
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """Embed several texts in one inference call, preserving input order."""
+    response = clients.embeddings.embed(model="text-embedding-ada-002", input=texts, encoding_format="float")
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-def get_embeddings(text: str) -> List[float]:
-    try:
-        messages = [
-            {
-                "role": "system",
-                "content": """You are an AI assistant that generates search queries for Nestlé website content. 
-                Given a user query, infer the user's intent and provide a search query. Format a JSON response 
-                with a search_query field that would best find relevant information. 
-                Examples: {"search_query": "Does Nestle sell kitkat chocolate"}""",
-            },
-            {"role": "user", "content": text},
-        ]
 
-        intent_response = chat.complete(model="gpt-4o-mini", messages=messages, temperature=0.7, max_tokens=150)
-        search_query = intent_response.choices[0].message.content
-        embeddings = project.inference.get_embeddings_client()
-        response = embeddings.embed(model="text-embedding-ada-002", input=search_query, encoding_format="float")
+async def embed_batch(texts: List[str]) -> List[List[float]]:
+    tokens = sum(count_tokens(text) for text in texts)
+    async with embed_scheduler.slot(tokens):
+        return await hedger.call("embed", embed_many, texts, admit_hedge=partial(embed_scheduler.try_acquire, tokens))
+
+
+async def embed_text(text: str) -> np.ndarray:
+    cached = query_cache.get_embedding(text)
+    if cached is not None:
+        return cached
+
+    with span("embed"):
+        if settings.EMBED_BATCHING_ENABLED:
+            vector = await with_deadline(embedding_batcher.embed(text), "embed")
+        else:
+            vector = (await embed_batch([text]))[0]
+    return query_cache.set_embedding(text, vector)
+
 
-        floats_array = response.data[0].embedding
-        return floats_array
+async def get_embeddings(text: str, history: Optional[List[Dict]] = None) -> np.ndarray:
+    try:
+        search_query = await rewrite_query(text, history)
+        return await embed_text(search_query)
+    except (Overloaded, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating embeddings {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate embeddings")
 
 
-def search_documents(query_vector: List[float], top_k: int = 3) -> List[SearchResult]:
-    """Search documents using vector similarity in Azure Cognitive Search."""
+async def search_documents(query_vector: np.ndarray, top_k: int = 3) -> List[SearchResult]:
+    """Search documents using vector similarity in the configured search backend."""
     try:
-        vector_query = VectorizedQuery(vector=query_vector, k_nearest_neighbors=top_k, fields="text_vector")
-
-        results = search_client.search(
-            search_text=None, vector_queries=[vector_query], select=["chunk", "title", "chunk_id", "parent_id"]
-        )
-        search_results = []
-        for result in results:
-            search_results.append(
-                SearchResult(content=result["chunk"], source=result["parent_id"], score=result["@search.score"])
-            )
-        return search_results
+        with span("search"):
+            return await hedger.call("search", clients.search_backend.search, query_vector, top_k)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error searching documents: {e}")
         raise HTTPException(status_code=500, detail="Failed to search documents")
 
 
-def count_tokens(text: str) -> int:
-    """Count the number of tokens in a text string."""
+def merge_results(primary: List[SearchResult], secondary: List[SearchResult], top_k: int) -> List[SearchResult]:
+    """Union of two result lists, keeping the best score for chunks found by both."""
+    merged: Dict[Tuple[str, str], SearchResult] = {}
+    for result in primary + secondary:
+        key = (result.source, result.content)
+        if key not in merged or result.score > merged[key].score:
+            merged[key] = result
+    return sorted(merged.values(), key=lambda x: x.score, reverse=True)[:top_k]
+
+
+async def _retrieve_rewritten(
+    query: str, history: Optional[List[Dict]] = None, top_k: int = 3
+) -> Tuple[np.ndarray, List[SearchResult], float]:
+    start = time.perf_counter()
+    query_embedding = await get_embeddings(query, history)
+    search_results = await search_documents(query_embedding, top_k)
+    return query_embedding, search_results, (time.perf_counter() - start) * 1000
+
+
+def _report_speculation(outcome: str, raw_ms: float, wall_ms: float, rewritten: "asyncio.Task"):
+    """
+    Report how much latency speculation saved compared to waiting on the rewrite path, as a
+    "speculation" Server-Timing entry. When the raw results were kept this runs once the rewrite
+    finishes, so the entry is missing if the response headers went out first (e.g. streaming).
+    """
+    if rewritten.cancelled() or rewritten.exception() is not None:
+        logger.info(f"speculative retrieval: outcome={outcome} raw_ms={raw_ms:.0f} rewrite path failed")
+        return
+    rewrite_ms = rewritten.result()[2]
+    saved_ms = rewrite_ms - wall_ms
+    speculation_stats["saved_ms_total"] += saved_ms
+    timings = stage_timings.get()
+    if timings is not None:
+        timings["speculation"] = saved_ms
+    logger.info(
+        f"speculative retrieval: outcome={outcome} raw_ms={raw_ms:.0f} "
+        f"rewrite_ms={rewrite_ms:.0f} wall_ms={wall_ms:.0f} saved_ms={saved_ms:.0f}"
+    )
+
+
+async def retrieve(
+    query: str, top_k: int = 3, history: Optional[List[Dict]] = None
+) -> Tuple[np.ndarray, Optional[Dict], List[SearchResult]]:
+    """
+    Return the query embedding, a cached answer when one matches, and the search results.
+    With RERANK_ENABLED, RERANK_CANDIDATES results are retrieved and reranked locally down to `top_k`.
+    """
+    if not settings.RERANK_ENABLED:
+        return await _retrieve_candidates(query, top_k, history)
+
+    query_embedding, cached, candidates = await _retrieve_candidates(query, settings.RERANK_CANDIDATES, history)
+    if cached is not None:
+        return query_embedding, cached, []
+    with span("rerank"):
+        return query_embedding, None, reranker.rerank(query, candidates, top_k)
+
+
+async def _retrieve_candidates(
+    query: str, top_k: int, history: Optional[List[Dict]] = None
+) -> Tuple[np.ndarray, Optional[Dict], List[SearchResult]]:
+    """
+    In "speculative" RETRIEVAL_MODE the raw query is embedded and searched while the intent
+    rewrite is still in flight. SPECULATIVE_POLICY "raw" keeps the raw results when the best
+    score reaches SPECULATIVE_MIN_SCORE (otherwise it waits for the rewritten ones); "merge"
+    waits for both and merges them.
+    """
+    if settings.RETRIEVAL_MODE != "speculative":
+        query_embedding = await get_embeddings(query, history)
+        cached = answer_cache.get(query_embedding)
+        if cached is not None:
+            return query_embedding, cached, []
+        return query_embedding, None, await search_documents(query_embedding, top_k)
+
+    start = time.perf_counter()
+    speculation_stats["requests"] += 1
+    rewritten = asyncio.create_task(_retrieve_rewritten(query, history, top_k))
+
+    # In this mode the answer cache is keyed on the raw query embedding
+    query_embedding = await embed_text(query)
+    cached = answer_cache.get(query_embedding)
+    if cached is not None:
+        rewritten.cancel()
+        return query_embedding, cached, []
+
     try:
-        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-        return len(encoding.encode(text))
+        raw_results = await search_documents(query_embedding, top_k)
     except Exception as e:
-        print(f"Error counting tokens: {str(e)}. Using approximate count.")
-        # Fallback to approximate count if tiktoken fails
-        return int(len(text.split()) * 1.3)
+        print(f"Error in speculative raw query search: {e}")
+        raw_results = []
+    raw_ms = (time.perf_counter() - start) * 1000
 
+    policy = settings.SPECULATIVE_POLICY
+    if policy == "raw" and raw_results and raw_results[0].score >= settings.SPECULATIVE_MIN_SCORE:
+        # The rewrite keeps running in the background and still warms the query cache
+        speculation_stats["kept_raw"] += 1
+        rewritten.add_done_callback(partial(_report_speculation, "kept_raw", raw_ms, raw_ms))
+        return query_embedding, None, raw_results
 
-def truncate_context(context_list: List[SearchResult], max_tokens: int = 600) -> Tuple[str, List[Dict]]:
-    """Truncate context to fit within token limit while preserving the most relevant information."""
-    truncated_contexts = []
-    sources = []
-    total_tokens = 0
+    try:
+        _, rewritten_results, _ = await rewritten
+    except Exception as e:
+        if not raw_results:
+            raise
+        print(f"Error in speculative rewritten query search: {e}")
+        rewritten_results = []
+
+    if policy == "merge":
+        speculation_stats["merged"] += 1
+        search_results = merge_results(rewritten_results, raw_results, top_k)
+        outcome = "merged"
+    else:
+        speculation_stats["fell_back"] += 1
+        search_results = rewritten_results or raw_results
+        outcome = "fell_back"
+    _report_speculation(outcome, raw_ms, (time.perf_counter() - start) * 1000, rewritten)
+    return query_embedding, None, search_results
 
-    system_prompt = """You are a helpful assistant for the Nestlé website. 
+
+def count_tokens(text: str) -> int:
+    """Count the number of tokens in a text string."""
+    return len(get_encoding().encode(text))
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Quota a chat completion can consume: the prompt plus the most it may generate."""
+    return sum(count_tokens(message["content"]) + 4 for message in messages) + max_tokens
+
+
+CONTEXT_SYSTEM_PROMPT = """You are a helpful assistant for the Nestlé website. 
     Use the provided context to answer questions accurately. 
     If you're not sure about something, say so rather than making assumptions.
     Always maintain a professional and friendly tone."""
 
-    # Reserve tokens for system prompt, user query, and response
-    reserved_tokens = count_tokens(system_prompt) + 250  # 150 for query and formatting
-    remaining_tokens = max_tokens - reserved_tokens
-
-    for result in sorted(context_list, key=lambda x: x.score, reverse=True):
-        context_entry = f"Content: {result.content}\nSource: {result.source}"
-        context_tokens = count_tokens(context_entry)
 
-        if total_tokens + context_tokens <= remaining_tokens:
-            truncated_contexts.append(context_entry)
-            sources.append({"content": result.content, "source": result.source, "score": result.score})
-            total_tokens += context_tokens
-        else:
-            # Try to fit a truncated version of the content
-            words = result.content.split()
-            for i in range(len(words), 0, -1):
-                truncated_content = " ".join(words[:i])
-                context_entry = f"Content: {truncated_content}\nSource: {result.source}"
-                if count_tokens(context_entry) + total_tokens <= remaining_tokens:
-                    truncated_contexts.append(context_entry)
-                    sources.append({"content": truncated_content, "source": result.source, "score": result.score})
-                    break
-            break
+def truncate_context(context_list: List[SearchResult], max_tokens: Optional[int] = None) -> Tuple[str, List[Dict]]:
+    """Truncate context to fit within token limit while preserving the most relevant information."""
+    max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+    with span("truncate_context"):
+        # Reserve tokens for system prompt, user query, and response
+        reserved_tokens = count_tokens(CONTEXT_SYSTEM_PROMPT) + 250  # 150 for query and formatting
+        packer = ContextPacker(max_tokens - reserved_tokens, strategy=settings.CONTEXT_PACKING)
+        return packer.pack(context_list)
+
+
+def build_messages(query: str, context: List[SearchResult], history: Optional[List[Dict]] = None) -> List[Dict]:
+    """Build the chat messages for answering `query` from the retrieved context and the conversation so far."""
+    # Prepare context from search results
+    context_text, used_sources = truncate_context(context)
+    # Create the prompt
+    system_prompt = """You are a helpful assistant for the Nestlé website. 
+    Use the provided context to answer questions accurately and structure your responses like a product information card:
+
+    1. Start with a direct answer to the question
+    2. List specific product variations with their details in bullet points
+    3. Include nutritional information when available
+    4. Add a reference link when relevant
+    
+    Format your response as a JSON object with these fields:
+    {
+        "mainAnswer": "The primary response to the question",
+        "productDetails": [
+            {
+                "name": "Product name/variant",
+                "details": ["Detail 1", "Detail 2"]
+            }
+        ],
+        "referenceLink": "URL or text reference",
+        "followUpInfo": "Additional relevant information (optional)"
+    }
+
+    Example for calories question:
+    {
+        "mainAnswer": "The calorie content of a KitKat bar varies depending on the size and type:",
+        "productDetails": [
+            {
+                "name": "KITKAT 4-Finger Wafer Bar, Milk Chocolate (45 g)",
+                "details": ["Calories: 230 per bar"]
+            },
+            {
+                "name": "KITKAT mini Chocolate Wafer Bars Pack of 30",
+                "details": ["Calories: 100 per 2 bars (25g)"]
+            }
+        ],
+        "referenceLink": "For more information, visit our nutrition page",
+        "followUpInfo": "Calorie content may vary by region and recipe"
+    }"""
 
-    return "\n".join(truncated_contexts), sources
+    user_prompt = f"""Context: {context_text}\n\nQuestion: {query}\n\n
+    Please provide a concise answer based on the context provided."""
+    return [{"role": "system", "content": system_prompt}, *(history or []), {"role": "user", "content": user_prompt}]
 
 
-def generate_response(query: str, context: List[SearchResult]) -> str:
+async def generate_response(query: str, context: List[SearchResult], history: Optional[List[Dict]] = None) -> str:
     """Generate response using Azure OpenAI with retrieved context."""
     try:
-        # Prepare context from search results
-        context_text, used_sources = truncate_context(context)
-        # Create the prompt
-        system_prompt = """You are a helpful assistant for the Nestlé website. 
-        Use the provided context to answer questions accurately and structure your responses like a product information card:
-
-        1. Start with a direct answer to the question
-        2. List specific product variations with their details in bullet points
-        3. Include nutritional information when available
-        4. Add a reference link when relevant
-        
-        Format your response as a JSON object with these fields:
-        {
-            "mainAnswer": "The primary response to the question",
-            "productDetails": [
-                {
-                    "name": "Product name/variant",
-                    "details": ["Detail 1", "Detail 2"]
-                }
-            ],
-            "referenceLink": "URL or text reference",
-            "followUpInfo": "Additional relevant information (optional)"
-        }
-
-        Example for calories question:
-        {
-            "mainAnswer": "The calorie content of a KitKat bar varies depending on the size and type:",
-            "productDetails": [
-                {
-                    "name": "KITKAT 4-Finger Wafer Bar, Milk Chocolate (45 g)",
-                    "details": ["Calories: 230 per bar"]
-                },
-                {
-                    "name": "KITKAT mini Chocolate Wafer Bars Pack of 30",
-                    "details": ["Calories: 100 per 2 bars (25g)"]
-                }
-            ],
-            "referenceLink": "For more information, visit our nutrition page",
-            "followUpInfo": "Calorie content may vary by region and recipe"
-        }"""
-
-        user_prompt = f"""Context: {context_text}\n\nQuestion: {query}\n\n
-        Please provide a concise answer based on the context provided."""
-        response = chat.complete(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        messages = build_messages(query, context, history)
+        estimate = estimate_tokens(messages, 300)
+        async with chat_scheduler.slot(estimate):
+            with span("generate"):
+                response = await hedger.call(
+                    "generate",
+                    clients.chat.complete,
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=300,
+                    admit_hedge=partial(chat_scheduler.try_acquire, estimate),
+                )
+        chat_scheduler.settle(estimate, reported_tokens(response))
+        record_usage("generate", response)
         return response.choices[0].message.content
+    except (Overloaded, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error generating response: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate response")
 
 
-def needs_context(query: str) -> bool:
-    query = query.lower().strip()
-
-    # First, check for exact product names - these ALWAYS need context
-    product_names = [
-        "kitkat",
-        "kit kat",
-        "kit-kat",
-        "nestle",
-        "nestlé",
-        "smarties",
-        "aero",
-        "coffee crisp",
-        # Add other Nestlé products
-    ]
+async def stream_response(
+    query: str, context: List[SearchResult], history: Optional[List[Dict]] = None
+) -> AsyncIterator[str]:
+    """Yield the completion for `query` piece by piece as the model produces it."""
+    messages = build_messages(query, context, history)
+    estimate = estimate_tokens(messages, 300)
+    async with chat_scheduler.slot(estimate):
+        with span("generate"):
+            # A stream cannot be hedged once tokens are flowing, but it still stops at the deadline
+            stream = await with_deadline(
+                run_blocking(
+                    clients.chat.complete,
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=300,
+                    stream=True,
+                ),
+                "generate",
+            )
+            updates = iter(stream)
+            while True:
+                # Each next() blocks on the HTTP response body, so pull updates on the pool
+                update = await with_deadline(run_blocking(next, updates, None), "generate")
+                if update is None:
+                    break
+                # Only the final update carries usage, and only when the service reports it
+                record_usage("generate", update)
+                chat_scheduler.settle(estimate, reported_tokens(update))
+                if update.choices and update.choices[0].delta.content:
+                    yield update.choices[0].delta.content
 
-    if any(product in query for product in product_names):
-        return True
-
-    # Then check for product-related terms
-    product_terms = [
-        "calories",
-        "nutrition",
-        "ingredients",
-        "recipe",
-        "product",
-        "chocolate",
-        "where can i buy",
-        "how much",
-        "price",
-    ]
 
-    if any(term in query for term in product_terms):
-        return True
-
-    # Only then check for general chatbot questions
-    general_questions = [
-        "who are you",
-        "what can you do",
-        "hello",
-        "hi",
-        "help",
-        "how do you work",
-        "what are you",
-        "your name",
-        "introduce yourself",
-    ]
+def generation_available() -> bool:
+    """Whether to call the model: the breaker is not open and the request has time left for a typical generation."""
+    remaining = time_left()
+    if remaining is not None:
+        needed = max(settings.DEGRADE_MIN_BUDGET_MS / 1000, hedger.typical("generate") or 0.0)
+        if remaining < needed:
+            return False
+    return generation_breaker.allow()
+
+
+def degraded_response(search_results: List[SearchResult]) -> Dict:
+    count_answer("degraded")
+    return {
+        "answer": templated_answer(search_results),
+        "sources": [
+            {"content": result.content, "source": result.source, "score": result.score} for result in search_results
+        ],
+        "degraded": True,
+    }
+
+
+def classify(query: str) -> Route:
+    with span("needs_context"):
+        return router.classify(query)
+
+
+def lookup_product(query: str) -> Optional[Dict]:
+    if not settings.PRODUCT_LOOKUP_ENABLED:
+        return None
+    with span("product_lookup"):
+        return product_table.answer(query)
+
+
+def canned_reply(route: Route) -> str:
+    return CHATTER_REPLY if route.name == CHATTER else GREETING
+
+
+def follow_up_results(session: Session, question: str, route: Route) -> Optional[List[SearchResult]]:
+    if not settings.SESSION_REUSE_RESULTS:
+        return None
+    results = session.follow_up_results(question, route.products)
+    if results is not None:
+        session_store.reused_results += 1
+    return results
+
+
+def record_turn(
+    session: Session, route: Route, question: str, result: Dict, reused: bool = False, searched: bool = True
+):
+    """
+    Add the answered question to the session history and keep its sources for follow-ups.
+    Product table answers (`searched=False`) are not search results and are not kept.
+    """
+    session.add_turn(question, result["answer"])
+    if searched and result["sources"]:
+        session.remember_results([SearchResult(**source) for source in result["sources"]], route.products, reused)
+    session_store.save(session)
+
+
+@app.get("/api/router/stats")
+async def router_stats():
+    return {
+        "terms": router.size,
+        "routes": dict(router.stats),
+        "product_lookups": {"products": len(product_table), "hits": product_table.hits, "misses": product_table.misses},
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/health")
+async def health():
+    return {"status": "ok", "startup": clients.timings}
+
+
+@app.get("/api/retrieval/stats")
+async def retrieval_stats():
+    return {
+        "mode": settings.RETRIEVAL_MODE,
+        "policy": settings.SPECULATIVE_POLICY,
+        **speculation_stats,
+        "rerank": {"enabled": settings.RERANK_ENABLED, **reranker.stats()},
+    }
+
+
+@app.get("/api/batching/stats")
+async def batching_stats():
+    return {"enabled": settings.EMBED_BATCHING_ENABLED, "embeddings": embedding_batcher.stats()}
+
+
+@app.get("/api/coalescing/stats")
+async def coalescing_stats():
+    return {"enabled": settings.COALESCE_QUERIES, **inflight.stats()}
+
 
-    return not any(q in query for q in general_questions)
+@app.get("/api/admission/stats")
+async def admission_stats():
+    return {"chat": chat_scheduler.stats(), "embeddings": embed_scheduler.stats()}
+
+
+@app.get("/api/hedging/stats")
+async def hedging_stats():
+    return hedger.stats()
+
+
+@app.get("/api/breaker/stats")
+async def breaker_stats():
+    return generation_breaker.stats()
+
+
+@app.get("/api/sessions/stats")
+async def sessions_stats():
+    return session_store.stats()
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {"query": query_cache.stats(), "answers": answer_cache.stats()}
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Admin endpoints answer 404 unless ADMIN_KEY is set, and 403 without the matching X-Admin-Key."""
+    if not settings.ADMIN_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key, settings.ADMIN_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+@app.post("/api/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_cache():
+    """
+    Called after the product index is refreshed (scraper/upload_documents.py does) so stale
+    answers are not served; the router and product table are reloaded from PRODUCTS_DIR too.
+    """
+    global router, product_table
+    answer_cache.invalidate()
+    router, product_table = await run_blocking(load_corpus)
+    return {"answers": answer_cache.stats(), "products": len(product_table)}
 
 
 @app.post("/api/chat")
-async def chat_endpoint(query: ChatQuery):
-    if not needs_context(query.query):
+async def chat_endpoint(query: ChatQuery, response: Response):
+    route = classify(query.query)
+    response.headers["X-Chat-Route"] = route.name
+    session = session_store.get(query.session_id)
+    if not route.needs_context:
+        # Keep the session alive for the next turn; the canned exchange itself is not worth history tokens
+        session_store.save(session)
         # Return response without context
         return {
-            "answer": "Hello! I am an AI assistant for the Made with Nestlé website. I can help you find recipes, cooking tips, and answer questions about Nestlé products.",
+            "answer": canned_reply(route),
             "sources": [],  # Empty sources array
+            "session_id": session.id,
         }
+    # Factual nutrient and ingredient questions are answered from the product table directly
+    lookup = lookup_product(query.query)
+    if lookup is not None:
+        response.headers["X-Answer-Source"] = "product_table"
+        record_turn(session, route, query.query, lookup, searched=False)
+        return {**lookup, "session_id": session.id}
+    request_deadline.set(time.monotonic() + settings.REQUEST_TIMEOUT)
+    history = session.messages()
+    reused = follow_up_results(session, query.query, route) if history else None
     try:
-        query_embedding = get_embeddings(query.query)
-        search_results = search_documents(query_embedding)
-        answer = generate_response(query.query, search_results)
-
-        return {
-            "answer": answer,
-            "sources": [
-                {"content": result.content, "source": result.source, "score": result.score} for result in search_results
-            ],
-        }
+        if reused is not None:
+            response.headers["X-Answer-Source"] = "previous_results"
+            result = await answer_query(query.query, history, reused)
+        elif not settings.COALESCE_QUERIES:
+            result = await answer_query(query.query, history)
+        else:
+            # Follow-ups depend on their conversation, so they only coalesce within the same session
+            key = (normalize_query(query.query),) if not history else (session.id, normalize_query(query.query))
+            if inflight.in_flight(("retrieve",) + key) or inflight.in_flight(("answer",) + key):
+                response.headers["X-Coalesced"] = "true"
+            result = await answer_coalesced(query.query, history, key)
+        record_turn(session, route, query.query, result, reused=reused is not None)
+        if result.get("degraded"):
+            response.headers["X-Answer-Source"] = "degraded"
+        return {**result, "session_id": session.id}
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+async def answer_query(
+    query: str, history: Optional[List[Dict]] = None, search_results: Optional[List[SearchResult]] = None
+) -> Dict:
+    """
+    Retrieve, generate and cache the answer to a question that needs product context. Given
+    `search_results` (a follow-up about the previous turn's products), retrieval is skipped.
+    When generation is unavailable the answer is templated from the sources and not cached.
+    """
+    query_embedding = None
+    if search_results is None:
+        query_embedding, cached, search_results = await retrieve(query, history=history)
+        if cached is not None:
+            count_answer("cached")
+            return cached
+    return await answer_from_results(query, search_results, history, query_embedding)
+
+
+async def answer_from_results(
+    query: str,
+    search_results: List[SearchResult],
+    history: Optional[List[Dict]] = None,
+    query_embedding: Optional[np.ndarray] = None,
+) -> Dict:
+    """The generated answer from retrieved results, cached under `query_embedding` when given."""
+    if not generation_available():
+        return degraded_response(search_results)
+    try:
+        answer = await generate_response(query, search_results, history)
+    except Overloaded:
+        raise
+    except Exception:
+        # generate_response has already logged the cause
+        generation_breaker.record_failure()
+        return degraded_response(search_results)
+    generation_breaker.record_success()
+    count_answer("generated")
+
+    response = {
+        "answer": answer,
+        "sources": [
+            {"content": result.content, "source": result.source, "score": result.score} for result in search_results
+        ],
+    }
+    if query_embedding is not None:
+        answer_cache.set(query_embedding, response)
+    return response
+
+
+async def answer_coalesced(query: str, history: Optional[List[Dict]], key: Tuple) -> Dict:
+    """
+    answer_query for a question concurrent identical questions may share: retrieval and
+    generation each run once per `key` through `inflight`. When this caller's deadline passes
+    while the shared generation is still running, it gets the answer templated from the results.
+    """
+    retrieval = partial(retrieve, query, history=history)
+    query_embedding, cached, search_results = await with_deadline(
+        inflight.do(("retrieve",) + key, retrieval), "retrieve"
+    )
+    if cached is not None:
+        count_answer("cached")
+        return cached
+    generation = partial(answer_from_results, query, search_results, history, query_embedding)
+    try:
+        return await with_deadline(inflight.do(("answer",) + key, generation), "answer")
+    except DeadlineExceeded:
+        return degraded_response(search_results)
+
+
+async def answer_batch_item(item: Tuple[int, object]) -> Dict:
+    """One line of /api/chat/batch output; failures are reported in the line instead of raised."""
+    index, raw = item
+    start = time.perf_counter()
+    query, item_id = parse_batch_item(raw)
+    record = {"index": index} if item_id is None else {"index": index, "id": item_id}
+    if query is None:
+        return {**record, "status": 400, "error": "Expected a query string or an object with a query field"}
+
+    # Each item runs in its own task, so it gets its own deadline
+    request_deadline.set(time.monotonic() + settings.REQUEST_TIMEOUT)
+    record["query"] = query
+    try:
+        route = classify(query)
+        record["route"] = route.name
+        if not route.needs_context:
+            result = {"answer": canned_reply(route), "sources": []}
+        else:
+            result = lookup_product(query)
+            if result is None and settings.COALESCE_QUERIES:
+                result = await answer_coalesced(query, None, (normalize_query(query),))
+            elif result is None:
+                result = await answer_query(query)
+        record.update(result, status=200)
+    except Overloaded as e:
+        record.update(status=503, error=str(e), retry_after=math.ceil(e.retry_after))
+    except DeadlineExceeded as e:
+        record.update(status=504, error=str(e))
+    except Exception as e:
+        record.update(status=500, error=str(e))
+    record["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+@app.post("/api/chat/batch", dependencies=[Depends(require_admin)])
+async def chat_batch_endpoint(request: Request, concurrency: int = settings.BATCH_CONCURRENCY):
+    """
+    Answer many queries in one request, for offline evaluation and cache warming. The body is
+    JSONL (one query string or {"query", "id"} object per line) or a JSON list of the same.
+    Results stream back as NDJSON in completion order, each tagged with its input index.
+    It spends model quota like any other traffic, so it is an admin endpoint.
+    """
+    concurrency = max(1, min(concurrency, settings.BATCH_MAX_CONCURRENCY))
+    # The body is read up front: the streaming response must not compete with it for ASGI receive.
+    # Queries are small; it is the answers that are streamed out rather than held.
+    body = await request.body()
+    try:
+        text = body.decode("utf-8")
+        if request.headers.get("content-type", "").startswith("application/json"):
+            queries = json.loads(text)
+            queries = queries.get("queries") if isinstance(queries, dict) else queries
+            if not isinstance(queries, list):
+                raise ValueError('Expected a JSON list of queries or {"queries": [...]}')
+            count, items = len(queries), iter_list(queries)
+        else:
+            count, items = sum(1 for line in body.split(b"\n") if line.strip()), iter_jsonl(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch body: {e}")
+    if count > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Batch has {count} queries; at most {settings.BATCH_MAX_ITEMS} are accepted"
+        )
+
+    async def lines():
+        async for record in run_bounded(items, answer_batch_item, concurrency):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(query: ChatQuery):
+    """
+    Server-sent events version of /api/chat. Emits a `sources` event as soon as retrieval
+    finishes, then one `token` event per completion chunk, then `done` (or `error`).
+    """
+
+    route = classify(query.query)
+    session = session_store.get(query.session_id)
+    done = {"session_id": session.id}
+
+    async def events():
+        request_deadline.set(time.monotonic() + settings.REQUEST_TIMEOUT)
+        if not route.needs_context:
+            session_store.save(session)
+            yield sse_event("sources", [])
+            yield sse_event("token", {"content": canned_reply(route)})
+            yield sse_event("done", done)
+            return
+        lookup = lookup_product(query.query)
+        if lookup is not None:
+            record_turn(session, route, query.query, lookup, searched=False)
+            yield sse_event("sources", lookup["sources"])
+            yield sse_event("token", {"content": lookup["answer"]})
+            yield sse_event("done", done)
+            return
+        history = session.messages()
+        try:
+            query_embedding, cached = None, None
+            search_results = follow_up_results(session, query.query, route) if history else None
+            reused = search_results is not None
+            if not reused and settings.COALESCE_QUERIES:
+                # Token streams are per client, but concurrent identical questions share retrieval
+                # Same keys as /api/chat, so streamed and plain requests share retrieval too
+                key = (normalize_query(query.query),) if not history else (session.id, normalize_query(query.query))
+                retrieval = partial(retrieve, query.query, history=history)
+                query_embedding, cached, search_results = await with_deadline(
+                    inflight.do(("retrieve",) + key, retrieval), "retrieve"
+                )
+            elif not reused:
+                query_embedding, cached, search_results = await retrieve(query.query, history=history)
+            if cached is not None:
+                count_answer("cached")
+                record_turn(session, route, query.query, cached)
+                yield sse_event("sources", cached["sources"])
+                yield sse_event("token", {"content": cached["answer"]})
+                yield sse_event("done", done)
+                return
+
+            sources = [
+                {"content": result.content, "source": result.source, "score": result.score} for result in search_results
+            ]
+            yield sse_event("sources", sources)
+
+            answer = []
+            if generation_available():
+                try:
+                    async for token in stream_response(query.query, search_results, history):
+                        answer.append(token)
+                        yield sse_event("token", {"content": token})
+                    generation_breaker.record_success()
+                    count_answer("generated")
+                except Overloaded:
+                    raise
+                except Exception as e:
+                    generation_breaker.record_failure()
+                    # Once tokens have been sent the answer cannot be swapped for a templated one
+                    if answer:
+                        raise
+                    print(f"Error generating response: {e}")
+
+            if answer:
+                result = {"answer": "".join(answer), "sources": sources}
+                if query_embedding is not None:
+                    answer_cache.set(query_embedding, result)
+            else:
+                result = degraded_response(search_results)
+                yield sse_event("token", {"content": result["answer"]})
+            record_turn(session, route, query.query, result, reused=reused)
+            yield sse_event("done", done)
+        except Overloaded as e:
+            yield sse_event("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+        except DeadlineExceeded as e:
+            yield sse_event("error", {"detail": str(e)})
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Chat-Route": route.name},
+    )
@@ -0,0 +1,118 @@
+from azure.ai.projects import AIProjectClient
+from azure.ai.projects.models import AuthenticationType, ConnectionType
+from azure.ai.inference import ChatCompletionsClient, EmbeddingsClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+from azure.identity import DefaultAzureCredential
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from requests.adapters import HTTPAdapter
+from search_backends import SearchBackend, create_search_backend
+from executor import run_blocking
+from typing import Dict, Optional
+import requests
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AzureClients:
+    """
+    Long-lived Azure clients shared by every request. Nothing here touches the network until
+    `connect` is called from the app lifespan; all clients then share one pooled HTTP session.
+    """
+
+    def __init__(self):
+        self.project: Optional[AIProjectClient] = None
+        self.chat: Optional[ChatCompletionsClient] = None
+        self.embeddings: Optional[EmbeddingsClient] = None
+        self.search_client: Optional[SearchClient] = None
+        self.index_client: Optional[SearchIndexClient] = None
+        self.search_backend: Optional[SearchBackend] = None
+        self.session: Optional[requests.Session] = None
+        self.timings: Dict[str, float] = {}
+
+    def _timed(self, name: str, start: float):
+        self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def connect(self, settings):
+        """Blocking: resolve connections and build the clients. Run it on the executor."""
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=settings.HTTP_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        start = time.perf_counter()
+        self.project = AIProjectClient.from_connection_string(
+            conn_str=settings.CONNECTION_STRING, credential=DefaultAzureCredential(), transport=self._transport()
+        )
+        self._timed("project_ms", start)
+
+        start = time.perf_counter()
+        search_connection = self.project.connections.get_default(
+            connection_type=ConnectionType.AZURE_AI_SEARCH, include_credentials=True
+        )
+        services_connection = self.project.connections.get_default(
+            connection_type=ConnectionType.AZURE_AI_SERVICES, include_credentials=True
+        )
+        self._timed("connections_ms", start)
+
+        start = time.perf_counter()
+        if getattr(services_connection, "authentication_type", None) == AuthenticationType.API_KEY:
+            endpoint = f"{services_connection.endpoint_url}/models"
+            credential = AzureKeyCredential(services_connection.key)
+            self.chat = ChatCompletionsClient(endpoint=endpoint, credential=credential, transport=self._transport())
+            self.embeddings = EmbeddingsClient(endpoint=endpoint, credential=credential, transport=self._transport())
+        else:
+            # Entra ID connections: let the SDK pick the credential scopes; each client keeps its own pool
+            self.chat = self.project.inference.get_chat_completions_client()
+            self.embeddings = self.project.inference.get_embeddings_client()
+
+        search_credential = AzureKeyCredential(key=search_connection.key)
+        self.index_client = SearchIndexClient(
+            endpoint=search_connection.endpoint_url, credential=search_credential, transport=self._transport()
+        )
+        self.search_client = SearchClient(
+            index_name=settings.AZURE_SEARCH_INDEX,
+            endpoint=search_connection.endpoint_url,
+            credential=search_credential,
+            transport=self._transport(),
+        )
+        self.search_backend = create_search_backend(settings, self.search_client)
+        self._timed("clients_ms", start)
+
+    def _transport(self) -> RequestsTransport:
+        return RequestsTransport(session=self.session, session_owner=False)
+
+    async def warm_up(self):
+        """Open pooled connections (DNS, TLS, auth) before the first user request needs them."""
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            run_blocking(
+                self.embeddings.embed, model="text-embedding-ada-002", input=["warm up"], encoding_format="float"
+            ),
+            run_blocking(self.search_client.get_document_count),
+            run_blocking(
+                self.chat.complete,
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1,
+            ),
+            return_exceptions=True,
+        )
+        for name, result in zip(["embeddings", "search", "chat"], results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up of {name} client failed: {result}")
+        self._timed("warm_up_ms", start)
+
+    def close(self):
+        for client in (self.chat, self.embeddings, self.search_client, self.index_client, self.project):
+            try:
+                if client is not None:
+                    client.close()
+            except Exception as e:
+                logger.warning(f"Error closing client: {e}")
+        if self.session is not None:
+            self.session.close()
@@ -1,7 +1,7 @@
 from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import ClassVar
+from typing import ClassVar, Optional
 import os
 
 
@@ -16,6 +16,83 @@ class Settings(BaseSettings):
     CONNECTION_STRING: str
     AZURE_SEARCH_INDEX: str = "product-vector-index"
     MODEL_NAME: str = "gpt-4o-mini"
+    # Upper bound on concurrent blocking Azure SDK calls
+    EXECUTOR_MAX_WORKERS: int = 32
+    # Connections kept per host in the HTTP pool shared by all Azure clients
+    HTTP_POOL_SIZE: int = 32
+    # Open connections to the model and search endpoints during startup
+    WARMUP_ENABLED: bool = True
+    # Rewritten-query and embedding cache
+    QUERY_CACHE_SIZE: int = 2048
+    QUERY_CACHE_TTL: float = 3600.0
+    # Semantic answer cache, served when cosine similarity to a cached query reaches the threshold
+    ANSWER_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_THRESHOLD: float = 0.97
+    ANSWER_CACHE_TTL: float = 6 * 3600.0
+    # "serial" rewrites the query before searching; "speculative" also searches the raw query in parallel
+    RETRIEVAL_MODE: str = "serial"
+    # "raw" keeps confident raw-query results, "merge" combines them with the rewritten-query results
+    SPECULATIVE_POLICY: str = "raw"
+    SPECULATIVE_MIN_SCORE: float = 0.85
+    # Token budget for retrieved context and how chunks are chosen ("greedy" or "mmr")
+    CONTEXT_MAX_TOKENS: int = 600
+    CONTEXT_PACKING: str = "greedy"
+    # Retrieve RERANK_CANDIDATES chunks and keep the best few by a blend of vector score and BM25 over the chunk text
+    RERANK_ENABLED: bool = False
+    RERANK_CANDIDATES: int = 20
+    RERANK_VECTOR_WEIGHT: float = 0.5
+    # Drop reranked chunks scoring below this fraction of the best one
+    RERANK_MIN_RATIO: float = 0.5
+    # Product JSON written by the scraper; feeds the query router vocabulary
+    PRODUCTS_DIR: str = "../../data/products"
+    # "azure" queries AZURE_SEARCH_INDEX; "local" searches an index built by `python search_backends.py build`
+    SEARCH_BACKEND: str = "azure"
+    LOCAL_INDEX_DIR: str = "../../data/index"
+    # Number of IVF lists for approximate local search; 0 keeps exact search
+    LOCAL_INDEX_NLIST: int = 0
+    LOCAL_INDEX_NPROBE: int = 8
+    # Answer nutrient/ingredient questions from the product table loaded from PRODUCTS_DIR
+    PRODUCT_LOOKUP_ENABLED: bool = True
+    # Embedding requests arriving within the window are sent as one batched call
+    EMBED_BATCHING_ENABLED: bool = True
+    EMBED_BATCH_WINDOW_MS: float = 5.0
+    EMBED_BATCH_MAX_SIZE: int = 16
+    # Identical in-flight questions share one rewrite/retrieve/generate execution
+    COALESCE_QUERIES: bool = True
+    # Deployment quotas the backend schedules model calls against; 0 disables a limit
+    CHAT_TPM: int = 30000
+    CHAT_RPM: int = 180
+    EMBED_TPM: int = 120000
+    EMBED_RPM: int = 720
+    # Calls allowed to wait for quota, and how long a request may wait before it is shed with a 503
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_TIMEOUT: float = 10.0
+    # Time budget for a whole request, shared by the rewrite, embedding, search and generation stages
+    REQUEST_TIMEOUT: float = 30.0
+    # Send a duplicate upstream call once the original is slower than this percentile of recent calls
+    HEDGE_ENABLED: bool = True
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_DELAY_MS: float = 50.0
+    # Upper bound on the fraction of calls that get a hedge
+    HEDGE_MAX_RATIO: float = 0.1
+    # Generation circuit breaker: opens after this many consecutive failures, probes again after the timeout
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_TIMEOUT: float = 30.0
+    # Answer from the sources without generating when less request budget than this is left
+    DEGRADE_MIN_BUDGET_MS: float = 1000.0
+    # Queries answered at once by /api/chat/batch by default, and the most a caller may ask for
+    BATCH_CONCURRENCY: int = 8
+    BATCH_MAX_CONCURRENCY: int = 32
+    # Most queries accepted in one /api/chat/batch request
+    BATCH_MAX_ITEMS: int = 1000
+    # Conversation sessions: how many are kept, idle expiry in seconds, and the token budget for history
+    SESSION_MAX: int = 10000
+    SESSION_IDLE_TTL: float = 1800.0
+    SESSION_HISTORY_TOKENS: int = 400
+    # Answer follow-ups about the same products from the previous turn's search results
+    SESSION_REUSE_RESULTS: bool = True
+    # Shared secret for the admin endpoints, sent in the X-Admin-Key header; they are disabled while it is unset
+    ADMIN_KEY: Optional[str] = None
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,174 @@
+from functools import cached_property, lru_cache
+from typing import Callable, Dict, List, Sequence, Tuple
+from models import SearchResult
+import tiktoken
+import time
+import re
+
+
+class _ApproximateEncoding:
+    """Stand-in used when tiktoken cannot load its BPE files; splits roughly like BPE does."""
+
+    _pattern = re.compile(r"\s?\w{1,4}|\s?[^\w\s]|\s+")
+
+    def encode(self, text: str) -> List[str]:
+        return self._pattern.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache()
+def get_encoding(model: str = "gpt-4o-mini"):
+    """Load the tokenizer once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        print(f"Error loading tiktoken encoding: {str(e)}. Using approximate tokenizer.")
+        return _ApproximateEncoding()
+
+
+# No realistic BPE token spans more characters than this
+MAX_CHARS_PER_TOKEN = 10
+
+
+class Candidate:
+    """A search result waiting to be packed; its content is tokenized at most once, on first use."""
+
+    def __init__(self, result: SearchResult, encoding, overhead: int, budget: int):
+        self.result = result
+        self.overhead = overhead
+        self._encoding = encoding
+        self._budget = budget
+        self._tokens = None
+
+    @property
+    def tokens(self) -> list:
+        if self._tokens is None:
+            # Only the first `budget` tokens can ever be packed, so a long chunk is encoded up to a
+            # character bound rather than in full
+            limit = (self._budget + 1) * MAX_CHARS_PER_TOKEN
+            self._truncated = len(self.result.content) > limit
+            self._tokens = self._encoding.encode(self.result.content[:limit])
+        return self._tokens
+
+    @cached_property
+    def token_set(self) -> set:
+        return set(self.tokens)
+
+    @property
+    def cost(self) -> int:
+        length = len(self.tokens)
+        if self._truncated:
+            length = max(length, self._budget + 1)
+        return self.overhead + length
+
+
+def greedy_by_score(candidates: List[Candidate]) -> List[Candidate]:
+    return sorted(candidates, key=lambda c: c.result.score, reverse=True)
+
+
+def mmr(candidates: List[Candidate], lambda_: float = 0.7) -> List[Candidate]:
+    """
+    Maximal marginal relevance ordering. Search results carry no vectors, so redundancy
+    between chunks is measured as Jaccard overlap of their token sets.
+    """
+    if not candidates:
+        return []
+    top_score = max(c.result.score for c in candidates) or 1.0
+    remaining = list(candidates)
+    # Highest overlap of each remaining candidate with anything already selected
+    redundancy = {id(c): 0.0 for c in remaining}
+    ordered: List[Candidate] = []
+    while remaining:
+        best = max(remaining, key=lambda c: lambda_ * (c.result.score / top_score) - (1 - lambda_) * redundancy[id(c)])
+        ordered.append(best)
+        remaining.remove(best)
+        for c in remaining:
+            union = len(c.token_set | best.token_set) or 1
+            redundancy[id(c)] = max(redundancy[id(c)], len(c.token_set & best.token_set) / union)
+    return ordered
+
+
+PACKING_STRATEGIES: Dict[str, Callable[[List[Candidate]], List[Candidate]]] = {
+    "greedy": greedy_by_score,
+    "mmr": mmr,
+}
+
+
+class ContextPacker:
+    """
+    Packs search results into a token budget in a single pass. Each chunk is tokenized at
+    most once; the chunk that overflows the budget is cut on a token boundary and packing
+    stops there. Exact duplicate chunks of the same parent document are dropped.
+    """
+
+    def __init__(self, max_tokens: int, strategy: str = "greedy", min_fragment_tokens: int = 16):
+        if strategy not in PACKING_STRATEGIES:
+            raise ValueError(f"Unknown packing strategy {strategy}, expected one of {list(PACKING_STRATEGIES)}")
+        self.max_tokens = max_tokens
+        self.order = PACKING_STRATEGIES[strategy]
+        self.min_fragment_tokens = min_fragment_tokens
+        self.encoding = get_encoding()
+        self._prefix_tokens = len(self.encoding.encode("Content: "))
+
+    def candidates(self, results: Sequence[SearchResult]) -> List[Candidate]:
+        seen = set()
+        candidates = []
+        for result in results:
+            # The same chunk can come back more than once for a parent document
+            key = (result.source, " ".join(result.content.split()))
+            if key in seen:
+                continue
+            seen.add(key)
+            overhead = self._prefix_tokens + len(self.encoding.encode(f"\nSource: {result.source}"))
+            candidates.append(Candidate(result, self.encoding, overhead, self.max_tokens))
+        return candidates
+
+    def pack(self, results: Sequence[SearchResult]) -> Tuple[str, List[Dict]]:
+        contexts = []
+        sources = []
+        remaining = self.max_tokens
+
+        for candidate in self.order(self.candidates(results)):
+            result = candidate.result
+            if candidate.cost <= remaining:
+                content = result.content
+                remaining -= candidate.cost
+            else:
+                available = remaining - candidate.overhead
+                if available >= self.min_fragment_tokens:
+                    content = self.encoding.decode(candidate.tokens[:available])
+                    contexts.append(f"Content: {content}\nSource: {result.source}")
+                    sources.append({"content": content, "source": result.source, "score": result.score})
+                break
+            contexts.append(f"Content: {content}\nSource: {result.source}")
+            sources.append({"content": content, "source": result.source, "score": result.score})
+
+        return "\n".join(contexts), sources
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python context.py
+    sentence = (
+        "KITKAT 4-Finger Wafer Bar, Milk Chocolate 45 g. Ingredients: sugar, wheat flour, cocoa butter, "
+        "modified milk ingredients, cocoa mass, lactose, vegetable oil, soy lecithin, yeast, baking soda. "
+        "Calories 230, Fat 12 g, Sodium 25 mg, Carbohydrate 28 g, Sugars 22 g, Protein 3 g. "
+    )
+    for words_per_chunk in (150, 600, 2500):
+        chunk = " ".join((sentence * (words_per_chunk // 40 + 1)).split()[:words_per_chunk])
+        for n_chunks in (3, 20):
+            results = [
+                SearchResult(content=f"{i} {chunk}", source=f"product_{i}.json", score=1.0 - i / 100)
+                for i in range(n_chunks)
+            ]
+            for strategy in PACKING_STRATEGIES:
+                packer = ContextPacker(300, strategy)
+                runs = 50
+                start = time.perf_counter()
+                for _ in range(runs):
+                    packer.pack(results)
+                elapsed = (time.perf_counter() - start) / runs
+                print(
+                    f"{words_per_chunk:>5} words x {n_chunks:>2} chunks  {strategy:<6}  {elapsed * 1000:8.3f} ms/pack"
+                )
@@ -0,0 +1,98 @@
+from typing import Callable, Dict, List, Optional
+from models import SearchResult
+import json
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency after `failure_threshold` consecutive failures. While open,
+    `allow` refuses calls until `reset_timeout` has passed; then one probe call is let
+    through (half-open), and its outcome closes the breaker or opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        on_state_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.rejected = 0
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            if self.on_state_change is not None:
+                self.on_state_change(state)
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        # One probe at a time; a probe that never reported back (cancelled) is replaced after reset_timeout
+        if self.state == HALF_OPEN and (self.probe_started is None or now - self.probe_started >= self.reset_timeout):
+            self.probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_started = None
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_started = None
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "open_for_s": round(time.monotonic() - self.opened_at, 1) if self.state != CLOSED else 0.0,
+        }
+
+
+def templated_answer(results: List[SearchResult], max_products: int = 3, max_details: int = 3) -> str:
+    """
+    An answer built from the top search results alone, in the JSON shape the model produces.
+    The first line of each chunk names the product; the following lines become its details.
+    """
+    product_details = []
+    for result in results[:max_products]:
+        lines = [line.strip() for line in result.content.splitlines() if line.strip()]
+        if not lines:
+            continue
+        details = [line if len(line) <= 200 else line[:197] + "..." for line in lines[1 : max_details + 1]]
+        product_details.append({"name": lines[0][:100], "details": details})
+
+    if product_details:
+        main_answer = (
+            "I can't put together a full answer right now, but here is what I found in our product information:"
+        )
+    else:
+        main_answer = "I can't answer that right now. Please try again in a moment."
+    answer = {
+        "mainAnswer": main_answer,
+        "productDetails": product_details,
+        "referenceLink": results[0].source if results else "",
+        "followUpInfo": "This summary was assembled directly from our product pages.",
+    }
+    return json.dumps(answer, ensure_ascii=False)
@@ -0,0 +1,155 @@
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from executor import run_blocking
+from admission import request_deadline
+import numpy as np
+import asyncio
+import threading
+import time
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before a stage finished."""
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current request's deadline, or None when it has none."""
+    deadline = request_deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+async def with_deadline(awaitable: Awaitable[T], stage: str) -> T:
+    """Await `awaitable`, giving up with DeadlineExceeded when the request deadline passes."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout=time_left())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Request deadline passed during {stage}")
+
+
+class LatencyTracker:
+    """Latencies of the most recent calls of one kind, recorded from the executor threads."""
+
+    def __init__(self, window: int = 512):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self.samples) < min_samples:
+                return None
+            values = np.fromiter(self.samples, dtype=np.float64)
+        return float(np.percentile(values, p))
+
+
+class Hedger:
+    """
+    Runs blocking upstream calls on the executor within the request deadline. When a call has
+    not returned after the `percentile` latency of recent calls of the same kind, an identical
+    call is sent and whichever finishes first wins. At most `max_ratio` of calls are hedged,
+    so a slow upstream never sees its load doubled.
+
+    The losing call is abandoned rather than interrupted: the SDKs block in their own threads,
+    so it runs to completion on the executor and its result is dropped.
+    """
+
+    def __init__(self, percentile: float, min_delay_ms: float, max_ratio: float, min_samples: int = 20):
+        self.enabled = True
+        self.percentile = percentile
+        self.min_delay = min_delay_ms / 1000
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.calls: Dict[str, int] = {}
+        self.hedged: Dict[str, int] = {}
+        self.hedge_wins: Dict[str, int] = {}
+        self.deadline_exceeded = 0
+
+    def delay(self, name: str) -> Optional[float]:
+        """How long to wait before hedging a call of this kind, or None to never hedge it yet."""
+        if not self.enabled:
+            return None
+        threshold = self.trackers.setdefault(name, LatencyTracker()).percentile(self.percentile, self.min_samples)
+        if threshold is None or self.hedged.get(name, 0) >= self.max_ratio * self.calls.get(name, 0):
+            return None
+        return max(threshold, self.min_delay)
+
+    def typical(self, name: str, percentile: float = 50.0) -> Optional[float]:
+        """Recent latency of calls of this kind at `percentile`, once enough have been seen."""
+        tracker = self.trackers.get(name)
+        return tracker.percentile(percentile, self.min_samples) if tracker is not None else None
+
+    def _start(self, name: str, func: Callable[..., T], *args, **kwargs) -> "asyncio.Future[T]":
+        tracker = self.trackers.setdefault(name, LatencyTracker())
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracker.record(time.perf_counter() - start)
+
+        return asyncio.ensure_future(run_blocking(timed))
+
+    async def call(
+        self,
+        name: str,
+        func: Callable[..., T],
+        *args,
+        admit_hedge: Optional[Callable[[], bool]] = None,
+        **kwargs,
+    ) -> T:
+        """
+        Run `func(*args, **kwargs)` on the executor, hedging it if it is slow. `admit_hedge` is
+        asked before a duplicate is sent, so hedges can be refused when quota is short.
+        """
+        self.calls[name] = self.calls.get(name, 0) + 1
+        primary = self._start(name, func, *args, **kwargs)
+        tasks = [primary]
+        try:
+            delay = self.delay(name)
+            remaining = time_left()
+            if delay is not None and (remaining is None or delay < remaining):
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and (admit_hedge is None or admit_hedge()):
+                    self.hedged[name] = self.hedged.get(name, 0) + 1
+                    tasks.append(self._start(name, func, *args, **kwargs))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=time_left(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.deadline_exceeded += 1
+                    raise DeadlineExceeded(f"Request deadline passed during {name}")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins[name] = self.hedge_wins.get(name, 0) + 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "deadline_exceeded": self.deadline_exceeded,
+            "calls": {
+                name: {
+                    "calls": count,
+                    "hedged": self.hedged.get(name, 0),
+                    "hedge_wins": self.hedge_wins.get(name, 0),
+                    "p_latency_ms": round((self.trackers[name].percentile(self.percentile, 1) or 0.0) * 1000, 1),
+                }
+                for name, count in sorted(self.calls.items())
+            },
+        }
@@ -0,0 +1,14 @@
+from pydantic.main import BaseModel
+from typing import Optional
+
+
+class ChatQuery(BaseModel):
+    query: str
+    # Returned by the previous answer; omit it to start a new conversation
+    session_id: Optional[str] = None
+
+
+class SearchResult(BaseModel):
+    content: str
+    source: str
+    score: float
@@ -0,0 +1,251 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+import numpy as np
+import glob
+import json
+import math
+import os
+import re
+
+# Words in a question that select nutrient columns; values are column name prefixes
+NUTRIENT_ALIASES = {
+    "calories": "calories",
+    "calorie": "calories",
+    "kcal": "calories",
+    "fat": "fat",
+    "fats": "fat",
+    "saturated": "saturated_fat",
+    "trans": "trans_fat",
+    "cholesterol": "cholesterol",
+    "sodium": "sodium",
+    "salt": "sodium",
+    "carbs": "carbohydrate",
+    "carbohydrate": "carbohydrate",
+    "carbohydrates": "carbohydrate",
+    "fibre": "fibre",
+    "fiber": "fibre",
+    "sugar": "sugars",
+    "sugars": "sugars",
+    "protein": "protein",
+    "calcium": "calcium",
+    "iron": "iron",
+    "potassium": "potassium",
+}
+INGREDIENT_WORDS = {"ingredients", "ingredient", "contain", "contains"}
+NUTRITION_WORDS = {"nutrition", "nutritional", "nutrients", "nutrient"}
+STOP_WORDS = {
+    "a",
+    "an",
+    "the",
+    "in",
+    "of",
+    "on",
+    "for",
+    "and",
+    "or",
+    "with",
+    "to",
+    "is",
+    "are",
+    "does",
+    "do",
+    "how",
+    "many",
+    "much",
+    "what",
+    "whats",
+    "which",
+    "there",
+    "per",
+    "bar",
+    "bars",
+    "pack",
+    "one",
+    "nestle",
+    "nestlé",
+    "me",
+    "tell",
+    "about",
+    "info",
+    "information",
+    "g",
+    "mg",
+    "ml",
+}
+# Words that make a question a comparison, which the table cannot answer by listing rows
+COMPARISON_WORDS = {
+    "vs",
+    "versus",
+    "compare",
+    "compared",
+    "comparison",
+    "difference",
+    "between",
+    "than",
+    "less",
+    "fewer",
+    "more",
+    "lower",
+    "higher",
+    "least",
+    "most",
+    "better",
+    "healthier",
+}
+UNITS = {"g": "g", "mg": "mg", "mcg": "mcg", "kj": "kJ", "kcal": "kcal"}
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-zà-ÿ0-9]+", text.lower().replace("-", ""))
+
+
+def load_products(products_dir: Optional[str]) -> List[Dict]:
+    """
+    The product JSON files the scraper wrote to `products_dir`, in file name order. Unreadable
+    files are reported and skipped; a missing or empty directory gives no products and a warning.
+    """
+    if not products_dir:
+        return []
+    paths = sorted(glob.glob(os.path.join(products_dir, "*.json")))
+    if not paths:
+        print(f"Warning: no product files in {os.path.abspath(products_dir)}")
+    products = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                products.append(json.load(f))
+        except Exception as e:
+            print(f"Error loading product file {path}: {str(e)}")
+    return products
+
+
+def format_nutrient(column: str, value: float) -> str:
+    name, _, unit = column.rpartition("_")
+    if unit not in UNITS:
+        name, unit = column, ""
+    amount = f"{value:g}"
+    label = name.replace("_", " ").capitalize()
+    return f"{label}: {amount} {UNITS[unit]}" if unit else f"{label}: {amount}"
+
+
+class ProductTable:
+    """
+    Column-oriented, in-memory view of the scraped products. Nutrients are stored one
+    float32 array per nutrient (NaN when a product does not list it), and products are
+    found through an inverted index over name and brand tokens.
+    """
+
+    def __init__(self, products: List[Dict], max_results: int = 5):
+        self.max_results = max_results
+        self.names = [p.get("name", "") for p in products]
+        self.brands = [p.get("brand", "") for p in products]
+        self.urls = [p.get("url", "") for p in products]
+        self.sizes = [p.get("size", "") for p in products]
+        self.ingredients = [p.get("ingredients") or [] for p in products]
+
+        columns = sorted({name for p in products for name in (p.get("nutrients") or {})})
+        self.nutrients: Dict[str, np.ndarray] = {}
+        for column in columns:
+            values = [(p.get("nutrients") or {}).get(column) for p in products]
+            self.nutrients[column] = np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+
+        self.index: Dict[str, Set[int]] = defaultdict(set)
+        self.brand_tokens: List[Set[str]] = []
+        for row, (name, brand) in enumerate(zip(self.names, self.brands)):
+            brand_tokens = {t for t in tokenize(brand) if t not in STOP_WORDS}
+            self.brand_tokens.append(brand_tokens)
+            for token in set(tokenize(name)) | brand_tokens:
+                if token not in STOP_WORDS:
+                    self.index[token].add(row)
+        self.idf = {token: math.log(1 + len(products) / len(rows)) for token, rows in self.index.items()}
+        self.brand_names: Dict[str, Set[str]] = {}
+        for brand, tokens in zip(self.brands, self.brand_tokens):
+            if tokens:
+                self.brand_names[brand] = tokens
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def find(self, tokens: List[str]) -> List[int]:
+        """Rows best matching the query tokens. A match must include a brand token or two name tokens."""
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        branded: Set[int] = set()
+        for token in set(tokens):
+            for row in self.index.get(token, ()):
+                scores[row] += self.idf[token]
+                matched[row] += 1
+                if token in self.brand_tokens[row]:
+                    branded.add(row)
+
+        candidates = [row for row in scores if row in branded or matched[row] >= 2]
+        if not candidates:
+            return []
+        best = max(scores[row] for row in candidates)
+        rows = [row for row in candidates if scores[row] >= 0.8 * best]
+        return sorted(rows, key=lambda row: (-scores[row], self.names[row]))[: self.max_results]
+
+    def named_brands(self, tokens: List[str]) -> Set[str]:
+        """Brands the query names in full, leaving out those only named as part of a longer brand name."""
+        query = set(tokens)
+        named = {brand for brand, brand_tokens in self.brand_names.items() if brand_tokens <= query}
+        return {
+            brand for brand in named if not any(self.brand_names[brand] < self.brand_names[other] for other in named)
+        }
+
+    def answer(self, query: str) -> Optional[Dict]:
+        """
+        Answer a factual nutrient or ingredient question straight from the table, in the same
+        JSON shape the model produces. Returns None when the question is not such a lookup, or
+        compares products or brands, which is left to the model.
+        """
+        tokens = tokenize(query)
+        # "kit kat" should find "KitKat"
+        tokens += [a + b for a, b in zip(tokens, tokens[1:])]
+        columns = [NUTRIENT_ALIASES[t] for t in tokens if t in NUTRIENT_ALIASES]
+        wants_ingredients = any(t in INGREDIENT_WORDS for t in tokens)
+        wants_all = any(t in NUTRITION_WORDS for t in tokens)
+        if not (columns or wants_ingredients or wants_all):
+            return None
+        if COMPARISON_WORDS.intersection(tokens) or len(self.named_brands(tokens)) > 1:
+            self.misses += 1
+            return None
+
+        lookup_words = set(NUTRIENT_ALIASES) | INGREDIENT_WORDS | NUTRITION_WORDS
+        rows = self.find([t for t in tokens if t not in lookup_words and t not in STOP_WORDS])
+        if not rows:
+            self.misses += 1
+            return None
+
+        selected = [c for c in self.nutrients if wants_all or any(c == p or c.startswith(p + "_") for p in columns)]
+        product_details = []
+        sources = []
+        for row in rows:
+            details = [
+                format_nutrient(c, float(self.nutrients[c][row]))
+                for c in selected
+                if not np.isnan(self.nutrients[c][row])
+            ]
+            if wants_ingredients and self.ingredients[row]:
+                details.append("Ingredients: " + ", ".join(self.ingredients[row]))
+            if not details:
+                continue
+            size = f" ({self.sizes[row]})" if self.sizes[row] else ""
+            product_details.append({"name": f"{self.names[row]}{size}", "details": details})
+            sources.append({"content": "; ".join(details), "source": self.urls[row], "score": 1.0})
+
+        if not product_details:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        brand = self.brands[rows[0]]
+        answer = {
+            "mainAnswer": f"Here is the information for {brand} products from our product catalogue:",
+            "productDetails": product_details,
+            "referenceLink": self.urls[rows[0]],
+            "followUpInfo": "Values are per serving as listed on the product page and may vary by region and recipe.",
+        }
+        return {"answer": json.dumps(answer, ensure_ascii=False), "sources": sources}
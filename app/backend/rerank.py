@@ -0,0 +1,108 @@
+from collections import Counter
+from typing import Dict, List
+from models import SearchResult
+import numpy as np
+import math
+import time
+import re
+
+TOKEN = re.compile(r"[a-zà-ÿ0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+    """BM25 of `query` against each document, with term statistics taken from `documents` themselves."""
+    terms = set(tokenize(query))
+    docs = [Counter(tokenize(doc)) for doc in documents]
+    if not terms or not docs:
+        return np.zeros(len(docs), dtype=np.float32)
+    lengths = np.array([sum(doc.values()) for doc in docs], dtype=np.float32)
+    avg_length = float(lengths.mean()) or 1.0
+    scores = np.zeros(len(docs), dtype=np.float32)
+    for term in terms:
+        tf = np.array([doc.get(term, 0) for doc in docs], dtype=np.float32)
+        df = int(np.count_nonzero(tf))
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        scores += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / avg_length))
+    return scores
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = float(values.max() - values.min()) if len(values) else 0.0
+    return (values - values.min()) / spread if spread else np.ones_like(values)
+
+
+class Reranker:
+    """
+    Reorders a wide set of vector search candidates by a blend of their vector score and
+    BM25 over the chunk text, each min-max normalized across the candidates, and keeps the
+    best `top_k`. Candidates scoring under `min_ratio` of the best are dropped as well, so
+    weak chunks do not reach the prompt just to fill the slots.
+    """
+
+    def __init__(self, vector_weight: float = 0.5, min_ratio: float = 0.0):
+        self.vector_weight = vector_weight
+        self.min_ratio = min_ratio
+        self.calls = 0
+        self.candidates = 0
+        self.kept = 0
+        self.cpu_seconds = 0.0
+
+    def rerank(self, query: str, results: List[SearchResult], top_k: int) -> List[SearchResult]:
+        if not results:
+            return []
+        start = time.thread_time()
+        vector = _min_max(np.array([r.score for r in results], dtype=np.float32))
+        lexical = _min_max(bm25_scores(query, [r.content for r in results]))
+        combined = self.vector_weight * vector + (1 - self.vector_weight) * lexical
+
+        order = np.argsort(-combined, kind="stable")[:top_k]
+        best = float(combined[order[0]])
+        reranked = [
+            SearchResult(content=results[i].content, source=results[i].source, score=round(float(combined[i]), 4))
+            for i in order
+            if combined[i] >= self.min_ratio * best
+        ]
+
+        self.calls += 1
+        self.candidates += len(results)
+        self.kept += len(reranked)
+        self.cpu_seconds += time.thread_time() - start
+        return reranked
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "mean_candidates": self.candidates / self.calls if self.calls else 0.0,
+            "mean_kept": self.kept / self.calls if self.calls else 0.0,
+            "cpu_ms_mean": self.cpu_seconds / self.calls * 1000 if self.calls else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python rerank.py [products_dir]
+    from search_backends import product_chunk
+    from products import load_products
+    import sys
+
+    products_dir = sys.argv[1] if len(sys.argv) > 1 else "../../data/products"
+    chunks = [product_chunk(product) for product in load_products(products_dir)]
+    if not chunks:
+        sentence = "KITKAT 4-Finger Wafer Bar, Milk Chocolate 45 g. Ingredients: sugar, wheat flour, cocoa butter. "
+        chunks = [f"Product {i} " + sentence * (1 + i % 5) for i in range(200)]
+
+    rng = np.random.default_rng(0)
+    reranker = Reranker()
+    for n_candidates in (10, 20, 50):
+        runs = 200
+        for _ in range(runs):
+            picked = rng.choice(len(chunks), size=min(n_candidates, len(chunks)), replace=False)
+            results = [SearchResult(content=chunks[i], source=str(i), score=float(rng.random())) for i in picked]
+            reranker.rerank("how many calories in a kitkat wafer bar", results, top_k=3)
+        print(f"{n_candidates:>3} candidates  {reranker.stats()['cpu_ms_mean']:.3f} ms CPU/rerank")
+        reranker = Reranker()
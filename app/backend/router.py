@@ -0,0 +1,193 @@
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+# Route names, in order of precedence when a query matches several categories
+PRODUCT = "product"
+PRODUCT_TERM = "product_term"
+GREETING = "greeting"
+ABOUT = "about"
+CHATTER = "chatter"
+DEFAULT = "default"
+
+PRECEDENCE = [PRODUCT, PRODUCT_TERM, ABOUT, GREETING, CHATTER]
+
+# Routes answered with a canned reply instead of retrieval and generation
+CANNED_ROUTES = {GREETING, ABOUT, CHATTER}
+
+SEED_TERMS: Dict[str, List[str]] = {
+    PRODUCT: ["kitkat", "kit kat", "kit-kat", "nestle", "nestlé", "smarties", "aero", "coffee crisp"],
+    PRODUCT_TERM: [
+        "calories",
+        "calorie",
+        "nutrition",
+        "nutrients",
+        "ingredients",
+        "ingredient",
+        "allergens",
+        "recipe",
+        "recipes",
+        "product",
+        "products",
+        "chocolate",
+        "where can i buy",
+        "how much",
+        "price",
+    ],
+    GREETING: ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
+    ABOUT: [
+        "who are you",
+        "what can you do",
+        "help",
+        "how do you work",
+        "what are you",
+        "your name",
+        "introduce yourself",
+    ],
+    CHATTER: ["thanks", "thank you", "bye", "goodbye", "how are you", "lol", "ok", "okay", "cool", "tell me a joke"],
+}
+
+# Words that may accompany a greeting or chatter without making it a question ("thanks so much")
+FILLER_WORDS = {
+    "a",
+    "again",
+    "all",
+    "and",
+    "there",
+    "lot",
+    "so",
+    "much",
+    "very",
+    "you",
+    "just",
+    "oh",
+    "well",
+    "please",
+    "everyone",
+    "today",
+}
+
+WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+
+
+class AhoCorasick:
+    """Multi-pattern matcher that reports only whole-word matches, in one pass over the text."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[int, str]]] = [[]]
+
+        for pattern, label in patterns:
+            node = 0
+            for char in pattern:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append((len(pattern), label))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: str) -> List[Tuple[int, int, str]]:
+        """Return (start, end, label) for every whole-word pattern occurrence in `text`."""
+        matches = []
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if not self.output[node]:
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            for length, label in self.output[node]:
+                start = end - length
+                if start == 0 or not text[start - 1].isalnum():
+                    matches.append((start, end, label))
+        return matches
+
+
+class Route:
+    def __init__(self, name: str, matches: List[str], products: Optional[List[str]] = None):
+        self.name = name
+        self.matches = matches
+        # The matches that name a brand or product
+        self.products = products or []
+
+    @property
+    def needs_context(self) -> bool:
+        return self.name not in CANNED_ROUTES
+
+
+class QueryRouter:
+    """
+    Classifies a query as product-related (needs retrieval) or as a greeting, question about
+    the assistant, or chatter that gets a canned reply. Unmatched queries default to retrieval.
+    """
+
+    def __init__(self, terms: Dict[str, Iterable[str]]):
+        patterns = {}
+        for label in reversed(PRECEDENCE):
+            for term in terms.get(label, []):
+                term = normalize(term)
+                if term:
+                    patterns[term] = label
+        self.size = len(patterns)
+        self.matcher = AhoCorasick(patterns.items())
+        self.stats: Counter = Counter()
+
+    @classmethod
+    def from_corpus(cls, products: List[Dict]) -> "QueryRouter":
+        """Seed terms plus the brand, product names and search_terms of the scraped `products`."""
+        terms = {label: list(values) for label, values in SEED_TERMS.items()}
+        for name in product_terms(products):
+            terms[PRODUCT].append(name)
+        return cls(terms)
+
+    def classify(self, query: str) -> Route:
+        text = normalize(query)
+        matches = self.matcher.search(text)
+        labels = {label for _, _, label in matches}
+        route = next((label for label in PRECEDENCE if label in labels), DEFAULT)
+        # A canned reply only when the greeting or chatter is the whole message, not a lead-in to a question
+        canned = [(start, end) for start, end, label in matches if label in CANNED_ROUTES]
+        if route in CANNED_ROUTES and not covers(text, canned):
+            route = DEFAULT
+        self.stats[route] += 1
+        products = [text[start:end] for start, end, label in matches if label == PRODUCT]
+        return Route(route, [text[start:end] for start, end, _ in matches], products)
+
+
+def covers(text: str, spans: List[Tuple[int, int]]) -> bool:
+    """Whether every word of `text` lies inside one of `spans` or is a filler word."""
+    for word in WORD.finditer(text):
+        inside = any(start <= word.start() and word.end() <= end for start, end in spans)
+        if not inside and word.group() not in FILLER_WORDS:
+            return False
+    return True
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def product_terms(products: List[Dict]) -> List[str]:
+    terms = []
+    for product in products:
+        for term in [product.get("name", ""), product.get("brand", "")] + product.get("search_terms", []):
+            # Very short name fragments ("g", "4") match far too much
+            if len(term) >= 3 and any(c.isalpha() for c in term):
+                terms.append(term)
+    return terms
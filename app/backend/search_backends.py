@@ -0,0 +1,203 @@
+from azure.search.documents.models import VectorizedQuery
+from typing import Callable, Dict, List, Optional
+from models import SearchResult
+from config import get_settings
+from products import load_products
+import numpy as np
+import json
+import time
+import sys
+import os
+
+
+class SearchBackend:
+    """Vector retrieval over the product corpus. `search` is blocking and is run on the executor."""
+
+    name = "base"
+
+    def search(self, query_vector: np.ndarray, top_k: int) -> List[SearchResult]:
+        raise NotImplementedError
+
+
+class AzureSearchBackend(SearchBackend):
+    """Queries the remote Azure AI Search vector index."""
+
+    name = "azure"
+
+    def __init__(self, search_client):
+        self.search_client = search_client
+
+    def search(self, query_vector: np.ndarray, top_k: int) -> List[SearchResult]:
+        vector_query = VectorizedQuery(vector=query_vector.tolist(), k_nearest_neighbors=top_k, fields="text_vector")
+
+        # The pager fetches lazily, so iterate it here to keep all network I/O off the event loop
+        results = self.search_client.search(
+            search_text=None, vector_queries=[vector_query], select=["chunk", "title", "chunk_id", "parent_id"]
+        )
+        search_results = []
+        for result in results:
+            search_results.append(
+                SearchResult(content=result["chunk"], source=result["parent_id"], score=result["@search.score"])
+            )
+        return search_results
+
+
+def product_chunk(product: Dict) -> str:
+    """Flatten a scraped product record into the text that gets embedded and returned as context."""
+    lines = [f"{product.get('name', '')} ({product.get('brand', '')}, {product.get('size', '')})"]
+    if product.get("ingredients"):
+        lines.append("Ingredients: " + ", ".join(product["ingredients"]))
+    if product.get("nutrients"):
+        lines.append("Nutrients: " + ", ".join(f"{name} {value}" for name, value in product["nutrients"].items()))
+    lines.append(f"URL: {product.get('url', '')}")
+    return "\n".join(lines)
+
+
+def build_local_index(
+    products_dir: str, index_dir: str, embed: Callable[[List[str]], List[List[float]]], batch_size: int = 16
+) -> int:
+    """
+    Embed every product JSON in `products_dir` and write the index to `index_dir`:
+    embeddings.npy (L2-normalized float32 rows) and chunks.json (row metadata).
+    """
+    chunks = [
+        {"chunk": product_chunk(product), "parent_id": product.get("url") or product.get("id") or str(row)}
+        for row, product in enumerate(load_products(products_dir))
+    ]
+
+    vectors = []
+    for i in range(0, len(chunks), batch_size):
+        vectors.extend(embed([c["chunk"] for c in chunks[i : i + batch_size]]))
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, "embeddings.npy"), np.ascontiguousarray(matrix))
+    with open(os.path.join(index_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(chunks, f, ensure_ascii=False)
+    return len(chunks)
+
+
+def kmeans(matrix: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over normalized rows; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(matrix[rng.choice(len(matrix), size=k, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        for c in range(k):
+            members = matrix[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class LocalVectorBackend(SearchBackend):
+    """
+    In-process exact or approximate (IVF) vector search over a locally built index.
+    The embedding matrix is memory-mapped, so start-up cost and resident memory stay
+    small for large corpora.
+    """
+
+    name = "local"
+
+    def __init__(self, matrix: np.ndarray, chunks: List[Dict], nlist: int = 0, nprobe: int = 8):
+        self.matrix = matrix
+        self.chunks = chunks
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        if nlist and len(matrix) > nlist:
+            self._build_ivf(nlist)
+
+    @classmethod
+    def load(cls, index_dir: str, nlist: int = 0, nprobe: int = 8) -> "LocalVectorBackend":
+        """Open an index written by build_local_index, memory-mapping the embedding matrix."""
+        matrix = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "chunks.json"), encoding="utf-8") as f:
+            chunks = json.load(f)
+        return cls(matrix, chunks, nlist=nlist, nprobe=nprobe)
+
+    def _build_ivf(self, nlist: int):
+        self.centroids = kmeans(self.matrix, nlist)
+        assignment = np.argmax(self.matrix @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(nlist)]
+
+    def search(self, query_vector: np.ndarray, top_k: int) -> List[SearchResult]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if self.centroids is None:
+            candidates = None
+            similarities = self.matrix @ query
+        else:
+            probes = np.argsort(self.centroids @ query)[::-1][: self.nprobe]
+            candidates = np.concatenate([self.lists[c] for c in probes])
+            similarities = self.matrix[candidates] @ query
+
+        k = min(top_k, len(similarities))
+        if k == 0:
+            return []
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        rows = top if candidates is None else candidates[top]
+
+        results = []
+        for row, similarity in zip(rows, similarities[top]):
+            chunk = self.chunks[int(row)]
+            # Same scale as Azure AI Search cosine scores: 1 / (1 + cosine distance)
+            score = 1.0 / (2.0 - float(similarity))
+            results.append(SearchResult(content=chunk["chunk"], source=chunk["parent_id"], score=score))
+        return results
+
+
+def create_search_backend(settings, search_client=None) -> SearchBackend:
+    if settings.SEARCH_BACKEND == "local":
+        return LocalVectorBackend.load(
+            settings.LOCAL_INDEX_DIR, nlist=settings.LOCAL_INDEX_NLIST, nprobe=settings.LOCAL_INDEX_NPROBE
+        )
+    if settings.SEARCH_BACKEND == "azure":
+        return AzureSearchBackend(search_client)
+    raise ValueError(f"Unknown SEARCH_BACKEND {settings.SEARCH_BACKEND}, expected 'azure' or 'local'")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        # Embed the scraped products into LOCAL_INDEX_DIR
+        from azure.ai.projects import AIProjectClient
+        from azure.identity import DefaultAzureCredential
+
+        settings = get_settings()
+        project = AIProjectClient.from_connection_string(
+            conn_str=settings.CONNECTION_STRING, credential=DefaultAzureCredential()
+        )
+        embeddings = project.inference.get_embeddings_client()
+
+        def embed(texts: List[str]) -> List[List[float]]:
+            response = embeddings.embed(model="text-embedding-ada-002", input=texts, encoding_format="float")
+            return [item.embedding for item in response.data]
+
+        count = build_local_index(settings.PRODUCTS_DIR, settings.LOCAL_INDEX_DIR, embed)
+        print(f"Indexed {count} products into {settings.LOCAL_INDEX_DIR}")
+
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # Exact vs IVF query latency and recall on a synthetic corpus: python search_backends.py bench [rows]
+        rows = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+        rng = np.random.default_rng(0)
+        # Clustered like real product embeddings: rows scattered around a few hundred topics
+        topics = rng.standard_normal((256, 1536), dtype=np.float32)
+        matrix = topics[rng.integers(0, 256, rows)] + 0.8 * rng.standard_normal((rows, 1536), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        chunks = [{"chunk": f"chunk {i}", "parent_id": str(i)} for i in range(rows)]
+        queries = matrix[rng.choice(rows, 100)] + 0.01 * rng.standard_normal((100, 1536), dtype=np.float32)
+
+        exact = LocalVectorBackend(matrix, chunks)
+        approximate = LocalVectorBackend(matrix, chunks, nlist=int(np.sqrt(rows)), nprobe=8)
+        truth = [{r.source for r in exact.search(q, 10)} for q in queries]
+        for backend_name, backend in (("exact", exact), ("ivf", approximate)):
+            start = time.perf_counter()
+            found = [{r.source for r in backend.search(q, 10)} for q in queries]
+            elapsed = (time.perf_counter() - start) / len(queries)
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+            print(f"{backend_name:<6} rows={rows} {elapsed * 1000:.3f} ms/query recall@10={recall:.3f}")
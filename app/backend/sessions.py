@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from cache import TTLCache
+from models import SearchResult
+from products import STOP_WORDS, tokenize
+import json
+import uuid
+
+# Words that point back at something said earlier ("what about the mini ones?")
+REFERRING_WORDS = {
+    "it",
+    "its",
+    "they",
+    "them",
+    "their",
+    "those",
+    "these",
+    "that",
+    "this",
+    "ones",
+    "one",
+    "same",
+    "other",
+}
+
+
+def compact_answer(answer: str) -> str:
+    """The part of a model answer worth remembering: mainAnswer and the product names it covered."""
+    try:
+        data = json.loads(answer)
+    except (TypeError, ValueError):
+        return answer
+    if not isinstance(data, dict):
+        return answer
+    names = [d.get("name", "") for d in data.get("productDetails") or [] if isinstance(d, dict)]
+    text = data.get("mainAnswer", "")
+    return f"{text} ({'; '.join(names)})" if names else text
+
+
+class Session:
+    """
+    One conversation. The most recent turns are kept verbatim; older ones are folded into a
+    rolling summary, and the summary keeps only its newest lines, so the history never
+    exceeds `history_tokens` however long the conversation runs.
+    """
+
+    def __init__(self, session_id: str, history_tokens: int, count_tokens: Callable[[str], int]):
+        self.id = session_id
+        self.history_tokens = history_tokens
+        self.count_tokens = count_tokens
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.summary: Deque[Tuple[str, int]] = deque()
+        # Retrieval state of the last turn that searched, for follow-up questions
+        self.results: List[SearchResult] = []
+        self.products: Set[str] = set()
+        self.vocabulary: Set[str] = set()
+
+    @property
+    def tokens(self) -> int:
+        return sum(tokens for *_, tokens in self.turns) + sum(tokens for _, tokens in self.summary)
+
+    def add_turn(self, question: str, answer: str):
+        answer = compact_answer(answer)
+        self.turns.append((question, answer, self.count_tokens(question) + self.count_tokens(answer)))
+        while self.tokens > self.history_tokens and len(self.turns) > 1:
+            old_question, old_answer, _ = self.turns.popleft()
+            line = f"- User asked: {old_question} Assistant: {old_answer}"
+            self.summary.append((line, self.count_tokens(line)))
+        while self.tokens > self.history_tokens and self.summary:
+            self.summary.popleft()
+        # A single turn larger than the whole budget is not kept at all
+        if self.tokens > self.history_tokens:
+            self.turns.clear()
+
+    def messages(self) -> List[Dict]:
+        """The history as chat messages, to place between the system prompt and the new question."""
+        messages = []
+        if self.summary:
+            lines = "\n".join(line for line, _ in self.summary)
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{lines}"})
+        for question, answer, _ in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def remember_results(self, results: List[SearchResult], products: List[str], reused: bool = False):
+        if reused:
+            self.products.update(products)
+            return
+        self.results = list(results)
+        self.products = set(products)
+        self.vocabulary = {token for result in results for token in tokenize(result.content)}
+
+    def follow_up_results(self, question: str, products: List[str]) -> Optional[List[SearchResult]]:
+        """
+        The previous search results, when the question is about the same products and asks
+        nothing new: it names only products that search covered, or names none but refers back
+        to the earlier answer, and every other content word already appears in those results.
+        """
+        if not self.results or not set(products) <= self.products:
+            return None
+        words = tokenize(question)
+        if not products and not REFERRING_WORDS.intersection(words):
+            return None
+        known = STOP_WORDS | REFERRING_WORDS | {token for product in products for token in tokenize(product)}
+        if any(word not in known and word not in self.vocabulary for word in words):
+            return None
+        return self.results
+
+
+class SessionStore:
+    """Sessions by id, LRU-bounded, expiring after `idle_ttl` seconds without a turn."""
+
+    def __init__(self, maxsize: int, idle_ttl: float, history_tokens: int, count_tokens: Callable[[str], int]):
+        self.sessions = TTLCache(maxsize, idle_ttl)
+        self.history_tokens = history_tokens
+        self.count_tokens = count_tokens
+        self.created = 0
+        self.reused_results = 0
+
+    def get(self, session_id: Optional[str]) -> Session:
+        """The live session with this id, or a new one when the id is missing, unknown or expired."""
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session = Session(uuid.uuid4().hex, self.history_tokens, self.count_tokens)
+            self.created += 1
+        return session
+
+    def save(self, session: Session):
+        # Setting the entry again restarts its idle timer
+        self.sessions.set(session.id, session)
+
+    def stats(self) -> Dict:
+        return {**self.sessions.stats(), "created": self.created, "reused_results": self.reused_results}
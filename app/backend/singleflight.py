@@ -0,0 +1,61 @@
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+from admission import deadline_context, request_deadline
+from contextvars import Context
+import asyncio
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Runs at most one execution per key at a time. Callers that arrive while a key is in
+    flight await the same task instead of starting their own, and all of them get its
+    result or its exception. Waiters are shielded from each other: a caller that is
+    cancelled (e.g. the client disconnected) stops waiting without cancelling the shared work.
+
+    The shared task runs until the latest deadline among the callers that have joined it (none
+    if any caller has none): a caller joining with more time left extends it for the stages
+    that start afterwards. Callers wrap `do` in `with_deadline` to stop waiting at their own.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, Tuple[asyncio.Task, Context]] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        deadline = request_deadline.get()
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.leaders += 1
+            context = deadline_context(deadline)
+            task = asyncio.get_running_loop().create_task(func(), context=context)
+            self._inflight[key] = (task, context)
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.followers += 1
+            task, context = entry
+            shared = context[request_deadline]
+            if shared is not None and (deadline is None or deadline > shared):
+                context.run(request_deadline.set, deadline)
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+        # Nobody may be left waiting (all callers cancelled); retrieve the exception so it is not logged as lost
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.leaders,
+            "coalesced": self.followers,
+            "coalesced_ratio": self.followers / total if total else 0.0,
+        }
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CONNECTION_STRING", "offline-test")
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Install benchmark.py's local stand-ins for the Azure services with the given median latencies (ms)."""
+    import benchmark
+    import chat
+
+    monkeypatch.setattr(chat.settings, "PRODUCT_LOOKUP_ENABLED", False)
+
+    def install(chat_ms: float = 100.0, embed_ms: float = 50.0, search_ms: float = 50.0, products=()):
+        args = benchmark.parse_args(
+            [
+                "--chat-latency-ms",
+                str(chat_ms),
+                "--embed-latency-ms",
+                str(embed_ms),
+                "--search-latency-ms",
+                str(search_ms),
+                "--sigma",
+                "0",
+                "--no-hedge",
+            ]
+        )
+        recorder = benchmark.install_fakes(args, list(products))
+        benchmark.reset_caches()
+        return recorder
+
+    return install
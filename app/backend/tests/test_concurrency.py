@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import httpx
+
+import chat
+
+
+async def post_all(queries):
+    transport = httpx.ASGITransport(app=chat.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/api/chat", json={"query": query}) for query in queries))
+        return time.perf_counter() - start, responses
+
+
+def test_concurrent_requests_take_about_as_long_as_one(offline):
+    offline(chat_ms=150, embed_ms=50, search_ms=50)
+    single, responses = asyncio.run(post_all(["Where can I buy wafer bar 0?"]))
+    assert responses[0].status_code == 200
+
+    # Distinct questions, so neither the caches nor request coalescing can share work
+    count = 8
+    offline(chat_ms=150, embed_ms=50, search_ms=50)
+    elapsed, responses = asyncio.run(post_all([f"Where can I buy wafer bar {i}?" for i in range(1, count + 1)]))
+
+    assert [response.status_code for response in responses] == [200] * count
+    # A blocked event loop would serialize them: about count * single
+    assert elapsed < 2 * single, f"{count} concurrent requests took {elapsed:.2f}s, one took {single:.2f}s"
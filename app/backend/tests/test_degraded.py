@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import httpx
+
+import benchmark
+import chat
+from degraded import CircuitBreaker
+
+
+class SlowGeneration(benchmark.LatencyModel):
+    """Quick intent rewrites, but answers that take longer than the request deadline."""
+
+    def __init__(self, generate_seconds: float):
+        super().__init__(0)
+        self.generate_seconds = generate_seconds
+
+    def wait(self, service: str):
+        time.sleep(self.generate_seconds if service == "generate" else 0.02)
+
+
+async def post_all(queries):
+    transport = httpx.ASGITransport(app=chat.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        return await asyncio.gather(*(client.post("/api/chat", json={"query": query}) for query in queries))
+
+
+def test_slow_generation_of_coalesced_questions_is_templated(offline, monkeypatch):
+    offline(chat_ms=20, embed_ms=20, search_ms=20)
+    chat.clients.chat.latency = SlowGeneration(1.5)
+    monkeypatch.setattr(chat.settings, "COALESCE_QUERIES", True)
+    monkeypatch.setattr(chat.settings, "REQUEST_TIMEOUT", 0.5)
+    monkeypatch.setattr(chat.settings, "DEGRADE_MIN_BUDGET_MS", 0.0)
+    monkeypatch.setattr(chat, "generation_breaker", CircuitBreaker(failure_threshold=5, reset_timeout=30))
+
+    coalesced = chat.inflight.stats()["coalesced"]
+    responses = asyncio.run(post_all(["Where can I buy the wafer bar?"] * 3))
+
+    assert [response.status_code for response in responses] == [200] * 3
+    assert all(response.headers["X-Answer-Source"] == "degraded" for response in responses)
+    assert all(response.json()["degraded"] for response in responses)
+    assert chat.inflight.stats()["coalesced"] > coalesced
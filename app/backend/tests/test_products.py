@@ -0,0 +1,54 @@
+import json
+
+from products import ProductTable
+
+PRODUCTS = [
+    {
+        "name": "KITKAT 4 Finger Wafer Bar",
+        "brand": "KitKat",
+        "url": "https://www.madewithnestle.ca/kitkat/4-finger",
+        "size": "45 g",
+        "ingredients": ["sugar", "wheat flour", "cocoa butter"],
+        "nutrients": {"calories": 230, "sugars_g": 22},
+    },
+    {
+        "name": "COFFEE CRISP Bar",
+        "brand": "Coffee Crisp",
+        "url": "https://www.madewithnestle.ca/coffee-crisp/bar",
+        "size": "50 g",
+        "ingredients": ["sugar", "modified milk ingredients", "coffee"],
+        "nutrients": {"calories": 250, "sugars_g": 25},
+    },
+    {
+        "name": "AERO Milk Chocolate Bar",
+        "brand": "Aero",
+        "url": "https://www.madewithnestle.ca/aero/milk",
+        "size": "42 g",
+        "ingredients": ["sugar", "milk ingredients", "cocoa butter"],
+        "nutrients": {"calories": 220, "sugars_g": 23},
+    },
+]
+
+
+def names(result):
+    return [product["name"] for product in json.loads(result["answer"])["productDetails"]]
+
+
+def test_single_product_lookup():
+    table = ProductTable(PRODUCTS)
+    assert names(table.answer("How many calories in a kit kat?")) == ["KITKAT 4 Finger Wafer Bar (45 g)"]
+    # A two-word brand is one product group
+    assert names(table.answer("coffee crisp ingredients")) == ["COFFEE CRISP Bar (50 g)"]
+
+
+def test_comparisons_are_left_to_the_model():
+    table = ProductTable(PRODUCTS)
+    assert table.answer("which has less calories, kitkat or coffee crisp") is None
+    assert table.answer("is aero healthier than kitkat? sugar please") is None
+    assert table.answer("kitkat vs aero calories") is None
+
+
+def test_several_brands_are_left_to_the_model():
+    table = ProductTable(PRODUCTS)
+    assert table.answer("calories in kitkat and coffee crisp") is None
+    assert table.answer("sugar in aero, kitkat") is None
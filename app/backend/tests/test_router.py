@@ -0,0 +1,31 @@
+from router import CHATTER, DEFAULT, GREETING, PRODUCT, QueryRouter
+
+CORPUS = [{"name": "BOOST Plus Calories Chocolate", "brand": "Boost", "search_terms": ["boost plus"]}]
+
+
+def route(query):
+    return QueryRouter.from_corpus(CORPUS).classify(query)
+
+
+def test_greeting_words_only_match_whole_words():
+    # "hi" is inside "which" and "chips"
+    assert route("which chips are gluten free").name == DEFAULT
+    assert route("which chips are gluten free").needs_context
+
+
+def test_greetings_and_chatter_on_their_own_get_a_canned_reply():
+    for query in ["hi", "Hello there!", "hi, thanks"]:
+        assert route(query).name == GREETING, query
+        assert not route(query).needs_context
+    assert route("thanks so much").name == CHATTER
+
+
+def test_greeting_as_a_lead_in_to_a_question_is_answered():
+    assert route("hello, what is in a kitkat").name == PRODUCT
+    assert route("hi, where can I find gluten free snacks").needs_context
+
+
+def test_corpus_terms_route_to_products():
+    result = route("is boost plus good after a workout")
+    assert result.name == PRODUCT
+    assert "boost plus" in result.products
@@ -0,0 +1,24 @@
+import asyncio
+
+import httpx
+
+import chat
+
+
+async def converse(queries):
+    transport = httpx.ASGITransport(app=chat.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        session_id, ids = None, []
+        for query in queries:
+            response = await client.post("/api/chat", json={"query": query, "session_id": session_id})
+            assert response.status_code == 200
+            session_id = response.json()["session_id"]
+            ids.append(session_id)
+        return ids
+
+
+def test_canned_reply_keeps_the_session(offline):
+    offline(chat_ms=10, embed_ms=10, search_ms=10)
+    ids = asyncio.run(converse(["hi", "thanks", "where can I buy the wafer bar?"]))
+    assert len(set(ids)) == 1
+    assert chat.session_store.sessions.get(ids[0]).messages()
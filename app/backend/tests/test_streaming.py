@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+import asyncio
+import json
+import time
+
+import benchmark
+import chat
+
+TOKENS = ['{"mainAnswer": ', '"Try ', "your ", "local ", 'grocer."', "}"]
+TOKEN_INTERVAL = 0.05
+
+
+class StreamingChat(benchmark.FakeChatCompletions):
+    """The benchmark chat stand-in, streaming its answer a token at a time when asked to."""
+
+    def complete(self, stream=False, **kwargs):
+        response = super().complete(**kwargs)
+        if not stream:
+            return response
+
+        def updates():
+            for token in TOKENS:
+                time.sleep(TOKEN_INTERVAL)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+        return updates()
+
+
+async def stream_events(query: str):
+    """
+    Drive /api/chat/stream through the raw ASGI interface and return (seconds, event, data)
+    for every server-sent event, timed when the app handed it to `send`.
+    """
+    body = json.dumps({"query": query}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/chat/stream",
+        "raw_path": b"/api/chat/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 5000),
+        "server": ("test", 80),
+    }
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client stays connected until the response is complete
+        await asyncio.Event().wait()
+
+    events = []
+    start = time.perf_counter()
+
+    async def send(message):
+        if message["type"] != "http.response.body":
+            return
+        elapsed = time.perf_counter() - start
+        for block in message.get("body", b"").decode().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+            if "event" in lines:
+                events.append((elapsed, lines["event"], json.loads(lines["data"])))
+
+    await chat.app(scope, receive, send)
+    return events
+
+
+def test_sources_arrive_before_tokens_and_tokens_stream(offline):
+    recorder = offline(chat_ms=100, embed_ms=20, search_ms=20)
+    chat.clients.chat = StreamingChat(chat.clients.chat.latency, recorder)
+
+    events = asyncio.run(stream_events("Where can I buy wafer bars?"))
+    names = [name for _, name, _ in events]
+
+    assert names[0] == "sources"
+    assert names[1:-1] == ["token"] * len(TOKENS)
+    assert names[-1] == "done"
+    assert "".join(data["content"] for _, name, data in events if name == "token") == "".join(TOKENS)
+
+    token_times = [elapsed for elapsed, name, _ in events if name == "token"]
+    sources_time = events[0][0]
+    assert sources_time < token_times[0]
+    # Sent as the model produces them, not buffered until the answer is complete
+    assert token_times[-1] - token_times[0] >= 0.8 * TOKEN_INTERVAL * (len(TOKENS) - 1)
+    assert token_times[0] - sources_time >= 0.8 * TOKEN_INTERVAL
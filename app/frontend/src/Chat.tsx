@@ -22,6 +22,7 @@ const ChatInterface = () => {
   const [input, setInput] = useState("");
   const [isOpen, setIsOpen] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   const sendMessage = useCallback(async () => {
     if (!input.trim()) return;
@@ -47,7 +48,7 @@ const ChatInterface = () => {
         {
           method: "POST",
           headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ query: userMessage }),
+          body: JSON.stringify({ query: userMessage, session_id: sessionId }),
         },
       );
 
@@ -61,6 +62,10 @@ const ChatInterface = () => {
         throw new Error("Invalid response format from API");
       }
 
+      if (data.session_id) {
+        setSessionId(data.session_id);
+      }
+
       // Update with bot response
       setMessages((prevMessages) => {
         console.log("Updating with bot message, prev:", prevMessages);
@@ -82,7 +87,7 @@ const ChatInterface = () => {
     } finally {
       setIsLoading(false);
     }
-  }, [input, messages]);
+  }, [input, messages, sessionId]);
 
   // Effect for monitoring messages changes
   useEffect(() => {
@@ -0,0 +1,101 @@
+"""
+Offline benchmark of brand page structure detection.
+
+A remote browser cannot reach local pages, so the saved brand pages in scraper/fixtures are
+served by a stand-in driver that answers each script call from the markup and sleeps for a
+fixed round trip. Detection with one probe per poll is compared with the old loop, which
+waited up to 2 s for each pattern's validation_element in turn:
+
+    python classify_benchmark.py --round-trip-ms 150
+"""
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selectolax.lexbor import LexborHTMLParser
+from page_strucutre_handler import BrandPageStructureHandler, PROBE_SCRIPT
+from typing import Dict, Optional
+import argparse
+import glob
+import time
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+
+class FixtureElement:
+    def is_displayed(self) -> bool:
+        return True
+
+
+class FixtureDriver:
+    """
+    Answers PROBE_SCRIPT and find_element from saved markup, counting round trips. Every
+    element in the markup counts as rendered.
+    """
+
+    def __init__(self, html: str, round_trip: float = 0.0):
+        self.tree = LexborHTMLParser(html)
+        self.round_trip = round_trip
+        self.round_trips = 0
+
+    def _trip(self):
+        self.round_trips += 1
+        time.sleep(self.round_trip)
+
+    def execute_script(self, script: str, selectors):
+        assert script == PROBE_SCRIPT, "only the structure probe is supported"
+        self._trip()
+        return [selector for selector in selectors if self.tree.css_first(selector) is not None]
+
+    def find_element(self, by: str, selector: str) -> FixtureElement:
+        self._trip()
+        if self.tree.css_first(selector) is None:
+            raise NoSuchElementException(selector)
+        return FixtureElement()
+
+
+def per_pattern_waits(driver) -> Optional[str]:
+    """The detection loop classify replaced: a 2 s visibility wait per pattern, later matches winning."""
+    found = None
+    for name, pattern in BrandPageStructureHandler().patterns.items():
+        if "products" not in pattern.selectors:
+            continue
+        try:
+            WebDriverWait(driver, 2).until(
+                EC.visibility_of_element_located((By.CSS_SELECTOR, pattern.validation_element))
+            )
+            found = name
+        except TimeoutException:
+            pass
+    return found
+
+
+def single_probe(driver) -> Optional[str]:
+    pattern = BrandPageStructureHandler().classify(driver)
+    return pattern.name if pattern else None
+
+
+def load_fixtures() -> Dict[str, str]:
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "brand_*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)[len("brand_") : -len(".html")]] = f.read()
+    return pages
+
+
+def main(round_trip: float):
+    for page, html in load_fixtures().items():
+        for label, detect in (("per-pattern waits", per_pattern_waits), ("single probe", single_probe)):
+            driver = FixtureDriver(html, round_trip)
+            start = time.perf_counter()
+            name = detect(driver)
+            seconds = time.perf_counter() - start
+            print(f"{page:10} {label:18} -> {str(name):10} {seconds:5.2f}s {driver.round_trips:3} round trips")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time brand page structure detection on the saved brand pages")
+    parser.add_argument("--round-trip-ms", type=float, default=150.0, help="latency of each driver round trip")
+    main(parser.parse_args().round_trip_ms / 1000)
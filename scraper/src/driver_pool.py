@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator
+from selenium.webdriver import Remote
+import threading
+import logging
+import queue
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    """
+    Up to `size` reusable WebDriver sessions shared by worker threads. A session is health
+    checked before it is handed out, and replaced after it has served `max_pages` pages or
+    raised while leased, so a broken session costs one page rather than the whole crawl.
+    """
+
+    def __init__(self, factory: Callable[[], Remote], size: int = 4, max_pages: int = 50):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        self.pages: Dict[int, int] = {}
+        self.created = 0
+        self.recycled = 0
+        self.unhealthy = 0
+        self.failed = 0
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _healthy(self, driver: Remote) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception as e:
+            logger.warning(f"Dropping unresponsive WebDriver session: {str(e)}")
+            return False
+
+    def _create(self) -> Remote:
+        driver = self.factory()
+        with self._lock:
+            self.created += 1
+            self.pages[id(driver)] = 0
+        logger.info(f"WebDriver session {self.created} started")
+        return driver
+
+    def _discard(self, driver: Remote):
+        with self._lock:
+            self.pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Error while closing WebDriver session: {str(e)}")
+
+    def _checkout(self) -> Remote:
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                return self._create()
+            if self._healthy(driver):
+                return driver
+            with self._lock:
+                self.unhealthy += 1
+            self._discard(driver)
+
+    def _checkin(self, driver: Remote):
+        with self._lock:
+            self.pages[id(driver)] += 1
+            worn_out = self.pages[id(driver)] >= self.max_pages
+            if worn_out:
+                self.recycled += 1
+        if worn_out:
+            self._discard(driver)
+        else:
+            self.idle.put(driver)
+
+    @contextmanager
+    def lease(self) -> Iterator[Remote]:
+        """A session for one page; it goes back to the pool afterwards unless it raised."""
+        with self._slots:
+            driver = self._checkout()
+            try:
+                yield driver
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                self._discard(driver)
+                raise
+            self._checkin(driver)
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "created": self.created,
+            "recycled": self.recycled,
+            "unhealthy": self.unhealthy,
+            "failed": self.failed,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
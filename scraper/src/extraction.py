@@ -0,0 +1,43 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from typing import Dict, Iterable, Optional
+
+# Field name -> CSS selector of the element whose text is the field's value
+PRODUCT_FIELDS = {
+    "name": ".product-title",
+    "size": ".product-size",
+    "ingredients": ".sub-ingredients",
+    "nutrients": ".nutrients-container",
+}
+
+# innerText of the first match of each selector, or null where nothing (or nothing but whitespace) matches
+EXTRACT_SCRIPT = """
+var fields = arguments[0], values = {};
+for (var name in fields) {
+    var element = document.querySelector(fields[name]);
+    values[name] = element === null ? null : element.innerText.trim() || null;
+}
+return values;
+"""
+
+
+def extract_fields(
+    driver, spec: Dict[str, str], timeout: float = 5, required: Optional[Iterable[str]] = None
+) -> Dict[str, Optional[str]]:
+    """
+    The text of every field in `spec` from one script call, repeated until all `required`
+    fields (by default every field) are found or `timeout` passes. Fields still missing from
+    the page then come back as None.
+    """
+    values: Dict[str, Optional[str]] = dict.fromkeys(spec)
+    required = list(spec if required is None else required)
+
+    def probe(d):
+        values.update(d.execute_script(EXTRACT_SCRIPT, spec) or {})
+        return all(values[field] is not None for field in required)
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.25).until(probe)
+    except TimeoutException:
+        pass
+    return values
@@ -2,8 +2,21 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selectolax.lexbor import LexborHTMLParser
+from static_scraper import CONCURRENCY, HTTP_PROXY
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse
+from typing import Dict, List, Optional, Set
+import aiohttp
+import asyncio
 import time
 
+PAGER_LINK = ".pager__item a"
+# Attempts at each listing page before the listing is given up on
+LISTING_ATTEMPTS = 3
+
+# Seconds spent listing each brand's products, for the end of crawl report
+listing_seconds: Dict[str, float] = {}
+
 
 def load_products(driver):
     print("Looking to load more products")
@@ -28,3 +41,115 @@ def load_products(driver):
         except Exception as e:
             print(f"No more 'More' button found or all products loaded: {str(e)}")
             break
+
+
+def extract_products(html: str, page_url: str, selector: str) -> List[Dict]:
+    tree = LexborHTMLParser(html)
+    products = []
+    for node in tree.css(selector):
+        href = node.attributes.get("href")
+        products.append({"name": node.text(strip=True), "url": urljoin(page_url, href) if href else None})
+    return products
+
+
+def pager_pages(html: str, page_url: str) -> Optional[Dict]:
+    """
+    The URL of the listing without its page number, and the highest page number the pager
+    links to. None when the pager has no link carrying a ?page= number to fetch directly.
+    """
+    numbers = []
+    template = None
+    for node in LexborHTMLParser(html).css(PAGER_LINK):
+        url = urlparse(urljoin(page_url, node.attributes.get("href") or ""))
+        query = parse_qs(url.query)
+        if query.get("page", [""])[0].isdigit():
+            numbers.append(int(query.pop("page")[0]))
+            template = url._replace(query=urlencode(query, doseq=True), fragment="")
+    if template is None:
+        return None
+    return {"url": template.geturl(), "last": max(numbers)}
+
+
+def page_url(template: str, page: int) -> str:
+    url = urlparse(template)
+    return url._replace(query=urlencode(parse_qs(url.query) | {"page": [str(page)]}, doseq=True)).geturl()
+
+
+async def fetch_listing(
+    template: str, last: int, selector: str, concurrency: int = CONCURRENCY
+) -> Optional[List[Dict]]:
+    """
+    Every product on listing pages 1 and up. Pages up to the highest one the pager showed are
+    fetched together; after that, `concurrency` pages at a time until a page adds no product
+    not already seen (Drupal serves the last page again for page numbers past the end).
+    None when a page still fails after LISTING_ATTEMPTS tries, since the listing would be cut short.
+    """
+
+    async def fetch(session: aiohttp.ClientSession, page: int) -> Optional[List[Dict]]:
+        url = page_url(template, page)
+        for attempt in range(1, LISTING_ATTEMPTS + 1):
+            try:
+                async with session.get(url, proxy=HTTP_PROXY) as response:
+                    response.raise_for_status()
+                    return extract_products(await response.text(), url, selector)
+            except Exception as e:
+                print(f"Error while fetching listing page {url} (attempt {attempt}/{LISTING_ATTEMPTS}): {str(e)}")
+                if attempt < LISTING_ATTEMPTS:
+                    await asyncio.sleep(attempt)
+        return None
+
+    products: List[Dict] = []
+    seen: Set[Optional[str]] = set()
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        start, end = 1, max(last, 1) + 1
+        while True:
+            pages = await asyncio.gather(*(fetch(session, page) for page in range(start, end)))
+            if any(page is None for page in pages):
+                return None
+            exhausted = False
+            for page in pages:
+                new = [product for product in page if product["url"] not in seen]
+                seen.update(product["url"] for product in new)
+                products.extend(new)
+                exhausted = exhausted or not new
+            if exhausted:
+                return products
+            start, end = end, end + concurrency
+
+
+def list_products(driver, brand: str, selector: str) -> List[Dict]:
+    """
+    The brand's products as {"name", "url"}, taken from the page the driver has open plus the
+    listing pages its pager links to, fetched in parallel over HTTP. Falls back to clicking
+    "More" in the browser when the pager has no page link to follow, or a listing page
+    cannot be fetched.
+    """
+    start = time.perf_counter()
+    html = driver.page_source
+    pager = pager_pages(html, driver.current_url)
+    listing = asyncio.run(fetch_listing(pager["url"], pager["last"], selector)) if pager is not None else None
+    if listing is not None:
+        method = "pager"
+        products = extract_products(html, driver.current_url, selector) + listing
+    elif LexborHTMLParser(html).css_first(PAGER_LINK) is not None:
+        if pager is not None:
+            print(f"Listing pages for {brand} could not all be fetched; loading them in the browser instead")
+        method = "click"
+        load_products(driver)
+        products = extract_products(driver.page_source, driver.current_url, selector)
+    else:
+        method = "single page"
+        products = extract_products(html, driver.current_url, selector)
+
+    seen: Set[str] = set()
+    unique = []
+    for product in products:
+        key = product["url"] or product["name"]
+        if key not in seen:
+            seen.add(key)
+            unique.append(product)
+
+    listing_seconds[brand] = time.perf_counter() - start
+    print(f"Listed {len(unique)} {brand} products in {listing_seconds[brand]:.1f}s ({method})")
+    return unique
@@ -1,8 +1,25 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from typing import Optional
+
+# Which of the given selectors match a rendered element on the page, in one round trip
+PROBE_SCRIPT = """
+return arguments[0].filter(function (selector) {
+    var element = document.querySelector(selector);
+    return element !== null && element.getClientRects().length > 0;
+});
+"""
+
+
 class SelectorPattern:
-    def __init__(self, name, validation_element, selectors):
+    def __init__(self, name, validation_element, selectors, listing_url=None, restart_driver=False):
         self.name = name
         self.validation_element = validation_element
         self.selectors = selectors
+        # Where the products are listed, when it is not the brand page itself
+        self.listing_url = listing_url
+        # Open the listing in a new session (work around for buggy behaviour)
+        self.restart_driver = restart_driver
 
 
 class BrandPageStructureHandler:
@@ -19,21 +36,27 @@ class BrandPageStructureHandler:
                 name="nescafe",
                 validation_element=".nescafe",
                 selectors={"products": ".product-title", "recipes": "Nescafe Recipes"},
+                listing_url="https://www.madewithnestle.ca/nescaf%C3%A9/coffee",
+                restart_driver=True,
             ),
             "haagen-dazs": SelectorPattern(
                 name="haagen-dazs",
                 validation_element=".haagen-dazs",
                 selectors={"products": ".views-field-title a", "recipes": "Recipes"},
+                listing_url="https://www.haagen-dazs.ca/en/hd-en/products",
+                restart_driver=True,
             ),
             "boost": SelectorPattern(
                 name="boost",
                 validation_element=".boost",
                 selectors={"products": ".views-field-title a", "recipes": "Recipes"},
+                listing_url="https://www.madewithnestle.ca/boost/products#products",
             ),
             "natures-bounty": SelectorPattern(
                 name="natures-bounty",
                 validation_element=".natures-bounty",
                 selectors={"products": ".views-field-title a", "recipes": ""},
+                listing_url="https://www.madewithnestle.ca/natures-bounty/our-products",
             ),
             "drumstick": SelectorPattern(
                 name="drumstick",
@@ -45,3 +68,19 @@ class BrandPageStructureHandler:
                 },
             ),
         }
+
+    def classify(self, driver, timeout: float = 2) -> Optional[SelectorPattern]:
+        """
+        The pattern the open page follows, found by checking every validation_element in one
+        script, repeated until one matches or `timeout` passes. Brand patterns come after
+        "standard" in the table, so when several match the last one wins.
+        """
+        candidates = [pattern for pattern in self.patterns.values() if "products" in pattern.selectors]
+        selectors = [pattern.validation_element for pattern in candidates]
+        try:
+            matched = WebDriverWait(driver, timeout, poll_frequency=0.25).until(
+                lambda d: d.execute_script(PROBE_SCRIPT, selectors) or False
+            )
+        except TimeoutException:
+            return None
+        return [pattern for pattern in candidates if pattern.validation_element in matched][-1]
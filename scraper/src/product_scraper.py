@@ -1,8 +1,6 @@
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
 from selenium.webdriver import Remote, ChromeOptions
+from extraction import extract_fields
 from dataclasses import dataclass
 from typing import List, Optional
 from dotenv import load_dotenv
@@ -30,6 +28,15 @@ class ProductData:
     nutrition_facts: Optional[list] = None
 
 
+PRODUCT_PAGE_FIELDS = {
+    "name": ".product-title",
+    "size": ".product-size",
+    "description": ".product-description p",
+    "ingredients": ".coh-ce-50eb162d p",
+    "nutrients": ".nutrients-container",
+}
+
+
 class ProductScraper:
     def __init__(self, driver: Remote, logger):
         self.driver = driver
@@ -41,41 +48,26 @@ class ProductScraper:
             self.driver.get(url)
             self.logger.info(f"Scraping product page: {url}")
 
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".product-media-carousel"))
-            )
-
-            self.logger.info(f"Awaited loading for selector: {url}")
-
-            name = self._safe_get_text(".product-title")
-            size = self._safe_get_text(".product-size")
-            description = self._safe_get_text(".product-description p")
-            ingredients = self._safe_get_text(".coh-ce-50eb162d p")  # safe get is not working so yeah
+            # Not every product has a description
+            required = [field for field in PRODUCT_PAGE_FIELDS if field != "description"]
+            fields = extract_fields(self.driver, PRODUCT_PAGE_FIELDS, timeout=10, required=required)
+            self.logger.info(f"Extracted fields for: {url}")
 
-            nutrition_facts = self.extract_nutrition()
             return ProductData(
                 url=url,
                 brand=brand,
-                size=size,
-                name=name,
-                description=description,
-                ingredients=ingredients,
-                nutrition_facts=nutrition_facts,
+                size=fields["size"],
+                name=fields["name"],
+                description=fields["description"],
+                ingredients=fields["ingredients"],
+                nutrition_facts=self.extract_nutrition(fields["nutrients"]),
             )
 
         except Exception as e:
             self.logger.error(f"Something went wrong: {str(e)}")
             return None
 
-    def _safe_get_text(self, selector: str) -> Optional[str]:
-        try:
-            element = WebDriverWait(self.driver, 5).until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-            return element.text.strip()
-        except Exception as e:
-            self.logger.error(f"Error while locating element - {str(e)}")
-            return None
-
-    def extract_nutrition(self):
+    def extract_nutrition(self, text: Optional[str]):
         # Nested function defintion
         def format_string(string: str) -> List[Nutrients]:
             # Remove white space and new line characters
@@ -97,8 +89,6 @@ class ProductScraper:
             return nutrients
 
         try:
-            nutrition_container = self.driver.find_element(By.CLASS_NAME, "nutrients-container")
-            text = nutrition_container.get_attribute("innerText")
             if text:
                 return format_string(text)
 
@@ -4,12 +4,17 @@ from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnecti
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from page_strucutre_handler import BrandPageStructureHandler
 from write_to_json import process_scraped_product
-from load_content import load_products
+from load_content import list_products, listing_seconds
 from scraping_logic import parse_nutrients
-from typing import Optional, Tuple
+from extraction import PRODUCT_FIELDS, extract_fields
+from driver_pool import DriverPool
+from static_scraper import fetch_products
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
+import asyncio
 import pprint
 import logging
 import sys
@@ -19,6 +24,15 @@ load_dotenv()
 AUTH = os.getenv("PROXY")
 SBR_CONNECTION_STRING = f"https://{AUTH}@brd.superproxy.io:9515"
 SBR_CONNECTION = ChromiumRemoteConnection(SBR_CONNECTION_STRING, "goog", "chrome")
+# Concurrent browser sessions for product pages, and how many pages a session serves before it is replaced
+POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", "4"))
+RECYCLE_AFTER = int(os.getenv("SCRAPER_RECYCLE_AFTER", "50"))
+# Fetch product pages over plain HTTP first and only open a browser for pages that parse incomplete
+STATIC_FIRST = os.getenv("SCRAPER_STATIC_FIRST", "true").lower() == "true"
+
+
+def new_driver() -> Remote:
+    return Remote(SBR_CONNECTION, options=ChromeOptions())
 
 
 class Scraper:
@@ -28,7 +42,7 @@ class Scraper:
         self.logging()
 
     def init_driver(self):
-        self.driver = Remote(SBR_CONNECTION, options=ChromeOptions())
+        self.driver = new_driver()
         self.logger.info("WebDriver init started")
 
     def logging(self):
@@ -76,55 +90,17 @@ class Scraper:
             assert self.driver is not None
             self.logger.info(f"Opened {brand} page")
 
-            brand_products = {}
-            for pattern_name, pattern in brand_handler.patterns.items():
-                if pattern_name == "standard":
-                    if self.wait_for_element(By.CSS_SELECTOR, pattern.validation_element, 2):
-                        # Need to redo for different page structures
-                        load_products(self.driver)
-                        product_grid = self.driver.find_elements(By.CSS_SELECTOR, pattern.selectors["products"])
-                        # Attach brand name to list of products
-                        brand_products = [
-                            {"name": element.text, "url": element.get_attribute("href")} for element in product_grid
-                        ]
-                elif pattern_name == "nescafe":
-                    if self.wait_for_element(By.CSS_SELECTOR, pattern.validation_element, 2):
-                        self.driver.quit()
-                        self.init_driver()
-                        self.driver.get("https://www.madewithnestle.ca/nescaf%C3%A9/coffee")
-                        load_products(self.driver)
-                        product_grid = self.driver.find_elements(By.CSS_SELECTOR, pattern.selectors["products"])
-                        brand_products = [
-                            {"name": element.text, "url": element.get_attribute("href")} for element in product_grid
-                        ]
-                elif pattern_name == "haagen-dazs":
-                    if self.wait_for_element(By.CSS_SELECTOR, pattern.validation_element, 2):
-                        # Work around for buggy behaviour
-                        self.driver.quit()
-                        self.init_driver()
-                        self.driver.get("https://www.haagen-dazs.ca/en/hd-en/products")
-                        load_products(self.driver)
-                        product_grid = self.driver.find_elements(By.CSS_SELECTOR, pattern.selectors["products"])
-                        brand_products = [
-                            {"name": element.text, "url": element.get_attribute("href")} for element in product_grid
-                        ]
-                elif pattern_name == "boost":
-                    if self.wait_for_element(By.CSS_SELECTOR, pattern.validation_element, 2):
-                        self.driver.get("https://www.madewithnestle.ca/boost/products#products")
-                        load_products(self.driver)
-                        product_grid = self.driver.find_elements(By.CSS_SELECTOR, pattern.selectors["products"])
-                        brand_products = [
-                            {"name": element.text, "url": element.get_attribute("href")} for element in product_grid
-                        ]
-                elif pattern_name == "natures-bounty":
-                    if self.wait_for_element(By.CSS_SELECTOR, pattern.validation_element, 2):
-                        self.driver.get("https://www.madewithnestle.ca/natures-bounty/our-products")
-                        load_products(self.driver)
-                        product_grid = self.driver.find_elements(By.CSS_SELECTOR, pattern.selectors["products"])
-                        brand_products = [
-                            {"name": element.text, "url": element.get_attribute("href")} for element in product_grid
-                        ]
-            return brand_products
+            pattern = brand_handler.classify(self.driver)
+            if pattern is None:
+                self.logger.error(f"No known page structure for {brand}")
+                return {}
+            self.logger.info(f"{brand} page follows the {pattern.name} structure")
+            if pattern.restart_driver:
+                self.driver.quit()
+                self.init_driver()
+            if pattern.listing_url:
+                self.driver.get(pattern.listing_url)
+            return list_products(self.driver, brand, pattern.selectors["products"])
 
         except Exception as e:
             self.logger.error(f"Error with brand {self.url}: {str(e)}")
@@ -133,38 +109,26 @@ class Scraper:
     def scrape_product_page(self, brand: str):
         try:
             assert self.driver is not None
-            self.logger.info(f"Scraping product page: {url}")
-
-            name = self._safe_get_text(".product-title")
-            size = self._safe_get_text(".product-size")
-            ingredients = self._safe_get_text(".sub-ingredients").split(",")
-            nutrients = parse_nutrients(self._safe_get_text(".nutrients-container"))
+            self.logger.info(f"Scraping product page: {self.url}")
+
+            fields = extract_fields(self.driver, PRODUCT_FIELDS)
+            missing = [field for field, value in fields.items() if value is None]
+            if missing:
+                self.logger.error(f"Missing {', '.join(missing)} on {self.url}")
+            if fields["name"] is None:
+                return None
             return {
-                "url": url,  # KEY=true
-                "name": name,
-                "size": size,
+                "url": self.url,  # KEY=true
+                "name": fields["name"],
+                "size": fields["size"] or "",
                 "brand": brand,
-                "nutrients": nutrients,
-                "ingredients": ingredients,
+                "nutrients": parse_nutrients(fields["nutrients"]) if fields["nutrients"] else {},
+                "ingredients": fields["ingredients"].split(",") if fields["ingredients"] else [],
             }
         except Exception as e:
             self.logger.error(f"Something went wrong: {str(e)}")
             return None
 
-    def _safe_get_text(self, selector: str) -> str:
-        try:
-            assert self.driver is not None
-            element = (
-                WebDriverWait(self.driver, 5)
-                .until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                .get_attribute("innerText")
-            )
-            assert element is not None
-            return element.strip()
-        except Exception as e:
-            self.logger.error(f"Error while locating element {selector}: {str(e)}")
-            return ""
-
     # Main function evokers
     def collect_brands(self):
         try:
@@ -214,6 +178,47 @@ class Scraper:
             if self.driver:
                 self.driver.quit()
 
+    def collect_product_info_with(self, pool: DriverPool, brand: str):
+        # Raises so the pool drops a session that failed mid-page
+        with pool.lease() as driver:
+            self.driver = driver
+            try:
+                driver.get(self.url)
+                return self.scrape_product_page(brand)
+            finally:
+                self.driver = None
+
+
+def collect_products_info(brand_products: Dict[str, Optional[List[Dict]]], pool: DriverPool) -> Iterator[Dict]:
+    """Scrape every product page across the pool's sessions, yielding product info as pages finish."""
+    logger = logging.getLogger(__name__)
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = {
+            executor.submit(Scraper(product["url"]).collect_product_info_with, pool, brand): product["url"]
+            for brand, products in brand_products.items()
+            for product in products or []
+        }
+        for future in as_completed(futures):
+            try:
+                product_info = future.result()
+            except Exception as e:
+                logger.error(f"Error occured while collecting {futures[future]}: {str(e)}")
+                continue
+            if product_info:
+                yield product_info
+
+
+def collect_products_info_static_first(
+    brand_products: Dict[str, Optional[List[Dict]]], pool: DriverPool
+) -> Iterator[Dict]:
+    complete, incomplete = asyncio.run(fetch_products(brand_products))
+    logging.getLogger(__name__).info(
+        f"Parsed {len(complete)} product pages without a browser, "
+        f"{sum(len(products) for products in incomplete.values())} left for Selenium"
+    )
+    yield from complete
+    yield from collect_products_info(incomplete, pool)
+
 
 if __name__ == "__main__":
     if len(sys.argv) == 1:
@@ -230,17 +235,15 @@ if __name__ == "__main__":
             scraper = Scraper(link)
             products = scraper.collect_brand_products(brand_name)
             brand_products[brand_name] = products
+        print(f"Listing time per brand: { {name: round(seconds, 1) for name, seconds in listing_seconds.items()} }")
 
         # Scrape all products collected. Do not need to run every time.
-        for brand, products in brand_products.items():
-            for product in products:
-                url = product["url"]
-                scraper = Scraper(url)
-                product_info = scraper.collect_product_info(brand)
-
-                if product_info:
-                    filepath = process_scraped_product(product_info)
-                    print(f"Write file to {filepath}")
+        with DriverPool(new_driver, size=POOL_SIZE, max_pages=RECYCLE_AFTER) as pool:
+            collect = collect_products_info_static_first if STATIC_FIRST else collect_products_info
+            for product_info in collect(brand_products, pool):
+                filepath = process_scraped_product(product_info)
+                print(f"Write file to {filepath}")
+            print(pool.stats())
     # Various cmd line arguments to test features
     elif sys.argv[1] == "load_test":
         # Confirm product loader for standard layout
@@ -255,6 +258,23 @@ if __name__ == "__main__":
         scraper = Scraper("https://www.madewithnestle.ca/natures-bounty")
         scraper.collect_brand_products("natures-bounty")
 
+    elif sys.argv[1] == "classify":
+        # Time page structure detection on brand pages
+        import time
+
+        urls = sys.argv[2:] or ["https://www.madewithnestle.ca/after-eight", "https://www.madewithnestle.ca/boost"]
+        scraper = Scraper(urls[0])
+        scraper.init_driver()
+        assert scraper.driver is not None
+        try:
+            for url in urls:
+                scraper.driver.get(url)
+                start = time.perf_counter()
+                pattern = BrandPageStructureHandler().classify(scraper.driver)
+                print(f"{url}: {pattern.name if pattern else None} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        finally:
+            scraper.driver.quit()
+
     elif sys.argv[1] == "test_brand_products":
         # Test brand product data format
         sample_brands = [
@@ -272,9 +292,8 @@ if __name__ == "__main__":
         urls = [
             "https://www.madewithnestle.ca/boost/boost-plus-calories-chocolate",
         ]
-        for url in urls:
-            scraper = Scraper(url)
-            product_info = scraper.collect_product_info("Boost")
-            pprint.pp(product_info)
-            if product_info:
+        with DriverPool(new_driver, size=POOL_SIZE, max_pages=RECYCLE_AFTER) as pool:
+            products = {"Boost": [{"url": url} for url in urls]}
+            for product_info in collect_products_info(products, pool):
+                pprint.pp(product_info)
                 process_scraped_product(product_info)
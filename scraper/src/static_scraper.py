@@ -0,0 +1,90 @@
+from selectolax.lexbor import LexborHTMLParser
+from scraping_logic import parse_nutrients
+from extraction import PRODUCT_FIELDS
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import aiohttp
+import asyncio
+import logging
+import sys
+import os
+
+load_dotenv()
+# Plain HTTP proxy for page fetches, if the site has to be reached through one
+HTTP_PROXY = os.getenv("SCRAPER_HTTP_PROXY")
+CONCURRENCY = int(os.getenv("SCRAPER_HTTP_CONCURRENCY", "16"))
+
+logger = logging.getLogger(__name__)
+
+
+def _text(tree: LexborHTMLParser, selector: str) -> Optional[str]:
+    node = tree.css_first(selector)
+    if node is None:
+        return None
+    # Separate adjacent elements the way innerText separates blocks, so "Calories</span><span>150" stays two words
+    return " ".join(node.text(deep=True, separator=" ").split()) or None
+
+
+def parse_product_page(html: str, url: str, brand: str) -> Dict:
+    """The product page in the shape Scraper.scrape_product_page returns; missing fields are None."""
+    tree = LexborHTMLParser(html)
+    fields = {field: _text(tree, selector) for field, selector in PRODUCT_FIELDS.items()}
+    ingredients = fields["ingredients"]
+    nutrients = fields["nutrients"]
+    return {
+        "url": url,  # KEY=true
+        "name": fields["name"],
+        "size": fields["size"],
+        "brand": brand,
+        "nutrients": parse_nutrients(nutrients) if nutrients else None,
+        "ingredients": ingredients.split(",") if ingredients else None,
+    }
+
+
+def is_complete(product_info: Dict) -> bool:
+    return all(product_info[field] for field in ("name", "size", "nutrients", "ingredients"))
+
+
+async def fetch_product(session: aiohttp.ClientSession, url: str, brand: str) -> Optional[Dict]:
+    try:
+        async with session.get(url, proxy=HTTP_PROXY) as response:
+            response.raise_for_status()
+            html = await response.text()
+    except Exception as e:
+        logger.error(f"Error while fetching {url}: {str(e)}")
+        return None
+    return parse_product_page(html, url, brand)
+
+
+async def fetch_products(
+    brand_products: Dict[str, Optional[List[Dict]]], concurrency: int = CONCURRENCY
+) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """
+    Fetch and parse every product page over pooled HTTP connections. Returns the complete
+    product info, and the products whose static page came back incomplete or failed, in
+    the `brand_products` shape so they can be handed to the Selenium scraper.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        jobs = [
+            (brand, product)
+            for brand, products in brand_products.items()
+            for product in products or []
+            if product.get("url")
+        ]
+        results = await asyncio.gather(*(fetch_product(session, product["url"], brand) for brand, product in jobs))
+
+    complete, incomplete = [], {}
+    for (brand, product), product_info in zip(jobs, results):
+        if product_info is not None and is_complete(product_info):
+            complete.append(product_info)
+        else:
+            incomplete.setdefault(brand, []).append(product)
+    return complete, incomplete
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    for url in sys.argv[1:]:
+        print(asyncio.run(fetch_products({"": [{"url": url}]})))
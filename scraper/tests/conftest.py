@@ -0,0 +1,26 @@
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+import threading
+import os
+import sys
+
+import pytest
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(SCRAPER_DIR, "fixtures")
+sys.path[:0] = [os.path.join(SCRAPER_DIR, "src"), SCRAPER_DIR]
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fixture_server():
+    """Base URL of a local server for the saved pages in scraper/fixtures."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=FIXTURES_DIR))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
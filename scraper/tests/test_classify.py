@@ -0,0 +1,16 @@
+from classify_benchmark import FixtureDriver, load_fixtures, single_probe
+
+
+def test_brand_pages_are_classified_in_one_round_trip():
+    pages = load_fixtures()
+    # boost pages also carry the standard listing; the brand pattern wins
+    for page, expected in (("standard", "standard"), ("boost", "boost"), ("nescafe", "nescafe")):
+        driver = FixtureDriver(pages[page])
+        assert single_probe(driver) == expected
+        assert driver.round_trips == 1
+
+
+def test_unrecognised_page_gives_up_after_the_timeout():
+    driver = FixtureDriver(load_fixtures()["unknown"])
+    assert single_probe(driver) is None
+    assert driver.round_trips > 1
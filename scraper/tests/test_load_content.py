@@ -0,0 +1,21 @@
+import asyncio
+
+import load_content
+from load_content import fetch_listing
+
+
+def test_listing_stops_when_a_page_repeats(fixture_server):
+    # The fixture server ignores ?page=, so page 2 repeats page 1 like Drupal does past the end
+    products = asyncio.run(fetch_listing(f"{fixture_server}/brand_standard.html", 1, ".views-field-title a"))
+
+    assert [product["name"] for product in products] == [
+        "AFTER EIGHT Dark Mint Bar",
+        "AFTER EIGHT Thin Mints",
+        "AFTER EIGHT Mint Truffles",
+    ]
+    assert products[0]["url"] == f"{fixture_server}/after-eight/dark-mint-bar"
+
+
+def test_failed_listing_page_is_not_an_empty_one(fixture_server, monkeypatch):
+    monkeypatch.setattr(load_content, "LISTING_ATTEMPTS", 2)
+    assert asyncio.run(fetch_listing(f"{fixture_server}/missing.html", 1, ".views-field-title a")) is None
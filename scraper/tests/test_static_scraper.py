@@ -0,0 +1,27 @@
+import asyncio
+
+from static_scraper import fetch_products, is_complete
+
+
+def test_complete_page_parses_without_a_browser(fixture_server):
+    complete, incomplete = asyncio.run(
+        fetch_products({"After Eight": [{"url": f"{fixture_server}/product_complete.html"}]})
+    )
+
+    assert incomplete == {}
+    [product] = complete
+    assert product["name"] == "AFTER EIGHT Dark Mint Bar"
+    assert product["size"] == "90 g"
+    assert product["brand"] == "After Eight"
+    assert product["nutrients"]["calories"] == 150.0
+    assert product["nutrients"]["sugars_g"] == 22.0
+    assert [i.strip() for i in product["ingredients"]][:2] == ["SUGAR", "COCOA MASS"]
+    assert is_complete(product)
+
+
+def test_incomplete_and_missing_pages_go_to_the_fallback(fixture_server):
+    products = [{"url": f"{fixture_server}/product_incomplete.html"}, {"url": f"{fixture_server}/missing.html"}]
+    complete, incomplete = asyncio.run(fetch_products({"Boost": products}))
+
+    assert complete == []
+    assert incomplete == {"Boost": products}
@@ -1,8 +1,12 @@
 import os
 import sys
 import logging
+import urllib.request
+from dotenv import load_dotenv
 from uploader import ProductBlobUploader
 
+load_dotenv()
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
@@ -27,6 +31,22 @@ def upload_documents(connection_string, directory_path):
             print(f"    - {f}")
 
 
+def invalidate_backend_cache():
+    """Tell the chat backend the product index changed, when BACKEND_URL and ADMIN_KEY are set."""
+    backend_url, admin_key = os.getenv("BACKEND_URL"), os.getenv("ADMIN_KEY")
+    if not backend_url or not admin_key:
+        print("BACKEND_URL or ADMIN_KEY not set: call POST /api/cache/invalidate on the backend yourself")
+        return
+    request = urllib.request.Request(
+        f"{backend_url.rstrip('/')}/api/cache/invalidate", method="POST", headers={"X-Admin-Key": admin_key}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            print(f"Backend cache invalidated: {response.read().decode('utf-8')}")
+    except Exception as e:
+        print(f"Error invalidating the backend cache: {str(e)}")
+
+
 def main():
     if len(sys.argv) < 3:
         print("Usage: python upload_documents.py <connection_string> <directory_path>")
@@ -57,6 +77,9 @@ def main():
         for f in results["failed"]:
             print(f"    - {f}")
 
+    if results["successful"]:
+        invalidate_backend_cache()
+
 
 if __name__ == "__main__":
     main()